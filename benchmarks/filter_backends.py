@@ -0,0 +1,76 @@
+"""
+Compare the zero-phase filter backends of Model (sosfiltfilt vs FFT) over
+window lengths, check that they agree, and report where the FFT backend
+starts to win.
+
+    python benchmarks/filter_backends.py [--channels 192] [--notches 3]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import sosfiltfilt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from model import Model  # noqa: E402
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=192, help="channels filtered at once (192 = 32x96 probe / 4x4 cells)")
+    parser.add_argument("--notches", type=int, default=3, help="50 Hz notch harmonics in the cascade")
+    parser.add_argument("--precision", default="float64")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    model = Model(96 * 32, 96, 32, 4, 4, precision=args.precision)
+    model.setup_filters(1, 200, 4, [(50, args.notches)], False)
+    fft = model._fft_filter
+    print(f"{model.sos_all.shape[0]} SOS sections, {args.channels} channels, {args.precision}")
+    print(f"impulse response settles in {fft.settle} samples; shorter than {fft.min_length} the FFT backend runs sosfiltfilt")
+    print(f"{'samples':>8} {'sos (ms)':>10} {'fft (ms)':>10} {'speedup':>8} {'max diff':>10}")
+
+    # Whole-window difference to sosfiltfilt, edges included, relative to the peak
+    tolerance = 1e-4 if model.precision == np.float32 else 1e-8
+    rng = np.random.default_rng(0)
+    crossover = None
+    for n in [128, 512, 2048, 8192, 16384, 32768, 65536, 131072]:
+        x = rng.normal(size=(n, args.channels)).astype(model.precision)
+        ref = sosfiltfilt(model.sos_all, x, axis=0)
+        model.filter_backend = "fft"
+        y = model.zero_phase_filter(x, axis=0)
+
+        model.filter_backend = "sos"
+        t_sos = best_time(lambda: model.zero_phase_filter(x, axis=0), args.repeat)
+        model.filter_backend = "fft"
+        t_fft = best_time(lambda: model.zero_phase_filter(x, axis=0), args.repeat)
+
+        diff = np.abs(y - ref).max() / np.abs(ref).max()
+        agree = diff <= tolerance
+        note = "" if agree else "  MISMATCH"
+        if n < fft.min_length:
+            note += "  (sos fallback)"
+        print(f"{n:>8} {t_sos * 1e3:>10.2f} {t_fft * 1e3:>10.2f} {t_sos / t_fft:>7.1f}x {diff:>10.1e}{note}")
+        # a crossover only counts where the backends give the same result
+        if crossover is None and agree and n >= fft.min_length and t_fft < t_sos:
+            crossover = n
+
+    if crossover is None:
+        print("sosfiltfilt was as fast or faster at every length")
+    else:
+        print(f"FFT backend wins from {crossover} samples ({crossover / model.fs:.1f} s at {model.fs} Hz)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Time the Model / Controller hot paths on synthetic probe recordings and
+flag regressions against a baseline stored for this machine.
+
+    python benchmarks/hot_paths.py --save            # record the baseline
+    python benchmarks/hot_paths.py                   # compare, exit 1 on regression
+    python benchmarks/hot_paths.py --probe 32x96 64x96 --events 200 --seconds 20
+
+For each probe size an interleaved int16 continuous.dat with a 50 Hz line,
+noise and an evoked response after every event is written to a scratch
+folder, then measured:
+
+    ingest_tail_mb_s    file tail (inotify) into the ring buffer, MB/s
+    ingest_poll_mb_s    polling reader (_watch_file), MB/s
+    live_tick_ms        Controller.get_live_update after 1 s of new samples
+    full_signal_ms      Controller.get_full_data, zero-phase live view
+    slice_ms            get_data_slice of one event window from disk
+    event_ms            compute_event of one event
+    denoise_svd_ms      apply_denoise of one window, SVD per window
+    denoise_proj_ms     apply_denoise of one window, calibrated projection
+    recompute_all_s     RecomputeEngine over every event
+    recompute_peak_mb   peak traced allocations during recompute_all
+    group_average_ms    Controller.get_data_event of the Average group
+    group_refresh_s     the same after a filter change (recomputes every event)
+
+Timings are the best of repeated runs, the steadiest figure on a busy
+machine; live ticks are the median tick.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from controller import Controller  # noqa: E402
+from recompute import RecomputeEngine  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+HIGHER_IS_BETTER = {"ingest_tail_mb_s", "ingest_poll_mb_s"}
+CHANNELS = [(0, 0), (1, 0), (2, 0), (3, 0)]  # live traces
+
+
+def write_recording(path, n_rows, n_cols, n_samples, fs, events, chunk=4096):
+    """Synthetic (samples, rows, cols) int16 recording, written chunk by chunk."""
+    rng = np.random.default_rng(0)
+    response_len = int(0.05 * fs)
+    response = (400 * np.exp(-np.arange(response_len) / (0.01 * fs))).astype(np.float32)
+    gain = rng.uniform(0.5, 1.5, n_rows * n_cols).astype(np.float32)
+    events = np.asarray(events)
+
+    with open(path, "wb") as f:
+        for start in range(0, n_samples, chunk):
+            n = min(chunk, n_samples - start)
+            t = np.arange(start, start + n) / fs
+            block = rng.normal(0, 30, (n, n_rows * n_cols)).astype(np.float32)
+            block += (100 * np.sin(2 * np.pi * 50 * t)).astype(np.float32)[:, None]
+            for ts in events[(events + response_len > start) & (events < start + n)]:
+                lo, hi = max(ts, start), min(ts + response_len, start + n)
+                block[lo - start:hi - start] += response[lo - ts:hi - ts, None] * gain
+            block.astype(np.int16).tofile(f)
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(fn):
+    """Peak bytes allocated (numpy included) while fn runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def wait_for(condition, timeout=60):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("reader did not catch up")
+        time.sleep(0.0005)
+
+
+def make_controller(n_rows, n_cols, divider, precision):
+    controller = Controller()
+    controller.precision = precision
+    controller.notch_freq = [(50, 3)]
+    controller.setup_event_view(n_rows * n_cols, n_cols, n_rows, divider, divider)
+    controller._configure_filters()
+    controller.model.setup_filters(controller.lc, controller.hc, controller.order, controller.notch_freq, controller.denoise)
+    return controller
+
+
+def bench_ingest(model, source, folder, mode, chunk_samples, run=0):
+    """Replay `source` into a new file as fast as possible while the reader follows it."""
+    live = folder / f"live_{mode}_{run}"
+    live.mkdir()
+    target = live / "continuous.dat"
+    target.touch()
+    model.data_path = live
+    model.file = target
+    model.ingest_mode = mode
+
+    raw = np.memmap(source, dtype=np.int16, mode="r").reshape(-1, model.num_channel)
+    total = raw.nbytes
+    model.start_stream(poll_interval=0.01)
+    try:
+        start = time.perf_counter()
+        with open(target, "ab") as f:
+            for i in range(0, raw.shape[0], chunk_samples):
+                f.write(raw[i:i + chunk_samples].tobytes())
+                f.flush()
+        wait_for(lambda: model._offset >= total)
+        elapsed = time.perf_counter() - start
+    finally:
+        model.stop_stream()
+    return total / 2**20 / elapsed
+
+
+def bench_live(controller, source, folder, ticks, repeat):
+    """Append one second of samples per tick and time the live-view update that follows."""
+    model = controller.model
+    live = folder / "live_ticks"
+    live.mkdir()
+    target = live / "continuous.dat"
+    target.touch()
+    model.data_path = live
+    model.file = target
+    model.ingest_mode = "tail"
+
+    raw = np.memmap(source, dtype=np.int16, mode="r").reshape(-1, model.num_channel)
+    tick = int(model.fs)
+    times = []
+    since = None
+    model.start_stream(poll_interval=0.01)
+    try:
+        with open(target, "ab") as f:
+            for i in range(ticks):
+                block = raw[i * tick:(i + 1) * tick]
+                f.write(block.tobytes())
+                f.flush()
+                expected = (i + 1) * tick * model.num_channel * 2
+                wait_for(lambda: model._offset >= expected)
+                start = time.perf_counter()
+                _, _, since, _ = controller.get_live_update(CHANNELS, since, max_points=1000)
+                times.append(time.perf_counter() - start)
+    finally:
+        model.stop_stream()
+
+    # zero-phase live view refilters the whole ring buffer each tick
+    model.live_filter_mode = "zero_phase"
+    full_signal = best_time(lambda: controller.get_full_data(False, CHANNELS, max_points=1000), repeat)
+    model.live_filter_mode = "causal"
+    # the first tick filters the whole buffer from scratch
+    return statistics.median(times[1:]) if len(times) > 1 else times[0], full_signal
+
+
+def bench_probe(n_rows, n_cols, args, folder):
+    controller = make_controller(n_rows, n_cols, args.divider, args.precision)
+    model = controller.model
+    model.reset_xy(controller.event_duration)
+
+    n_samples = int(args.seconds * model.fs)
+    margin = model.snapshot_len + 1
+    events = np.linspace(margin, n_samples - margin, args.events).astype(np.int64).tolist()
+    source = folder / f"{n_rows}x{n_cols}.dat"
+    start = time.perf_counter()
+    write_recording(source, n_rows, n_cols, n_samples, model.fs, events)
+    print(f"  wrote {source.stat().st_size / 2**20:.0f} MB in {time.perf_counter() - start:.1f} s")
+
+    results = {}
+    chunk = max(1, int(0.01 * model.fs))  # Open Ephys flushes every few ms
+    for mode in ("tail", "poll"):
+        results[f"ingest_{mode}_mb_s"] = max(bench_ingest(model, source, folder, mode, chunk, run) for run in range(3))
+    results["live_tick_ms"], results["full_signal_ms"] = (
+        t * 1e3 for t in bench_live(controller, source, folder, args.ticks, args.repeat))
+
+    # Event paths read the finished recording
+    model.file = source
+    model.data.reset()
+    sample = events[: min(len(events), args.repeat)]
+    results["slice_ms"] = 1e3 * min(
+        best_time(lambda ts=ts: np.array(model.get_data_slice(ts - model.snapshot_len, ts + model.snapshot_len)), 3)
+        for ts in sample)
+    results["event_ms"] = 1e3 * min(best_time(lambda ts=ts: model.compute_event(ts), 1) for ts in sample)
+
+    window = model.filter_signal(model.get_event_slice(events[0]), axis=0)
+    model.configure_denoise("svd")
+    results["denoise_svd_ms"] = 1e3 * best_time(lambda: model.apply_denoise(window), 3)
+    model.configure_denoise("calibration")
+    model.live_denoiser.fit(window.reshape(window.shape[0], -1))
+    results["denoise_proj_ms"] = 1e3 * best_time(lambda: model.apply_denoise(window), args.repeat)
+    model.configure_denoise(controller.denoise_method, controller.denoise_refit)
+
+    engine = RecomputeEngine()
+
+    def recompute_all():
+        model.data_event.clear()
+        engine.run(model, events)
+
+    results["recompute_all_s"] = best_time(recompute_all, 3)
+    results["recompute_peak_mb"] = peak_memory(recompute_all) / 2**20
+    engine.close()
+
+    controller.events = {str(ts): ts for ts in events}
+    controller.special_events["Average"] = list(events)
+    controller.event_type = "Average"
+    results["group_average_ms"] = 1e3 * best_time(
+        lambda: (controller.invalidate_group_stats(), controller.get_data_event(max_points=1000, sem=True)),
+        3)
+
+    # A filter change leaves every snapshot stale: the next view recomputes them all
+    highcuts = iter(range(controller.hc - 10, 0, -10))
+
+    def refresh():
+        model.setup_filters(controller.lc, next(highcuts), controller.order, controller.notch_freq, controller.denoise)
+        controller.get_data_event(max_points=1000, sem=True)
+
+    results["group_refresh_s"] = best_time(refresh, 3)
+
+    controller.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print every metric against the baseline; return the regressed ones."""
+    regressions = []
+    for probe, metrics in results.items():
+        print(f"\n{probe}")
+        print(f"  {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+        for name, value in metrics.items():
+            ref = baseline.get(probe, {}).get(name)
+            if ref is None:
+                print(f"  {name:<20} {'-':>10} {value:>10.2f}")
+                continue
+            change = value / ref - 1 if ref else 0.0
+            worse = -change if name in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append((probe, name))
+            print(f"  {name:<20} {ref:>10.2f} {value:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probe", nargs="+", default=["32x96", "64x96"], help="probe sizes as ROWSxCOLS")
+    parser.add_argument("--events", type=int, default=100, help="events in each recording")
+    parser.add_argument("--seconds", type=float, default=20, help="recording length")
+    parser.add_argument("--divider", type=int, default=4, help="display divider, rows and columns")
+    parser.add_argument("--precision", default="float64")
+    parser.add_argument("--ticks", type=int, default=10, help="live-view ticks (1 s of data each)")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per timing")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown flagged as a regression")
+    parser.add_argument("--workdir", help="folder for the synthetic recordings (default: a temporary one)")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        for probe in args.probe:
+            n_rows, n_cols = (int(v) for v in probe.lower().split("x"))
+            print(f"{probe} probe, {args.events} events, {args.seconds:g} s, {args.precision}")
+            folder = Path(tmp) / probe
+            folder.mkdir()
+            results[probe] = bench_probe(n_rows, n_cols, args, folder)
+
+    baseline = {}
+    if args.baseline.exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Headless reprocessing of recorded Open Ephys sessions.
+
+    neurolayer_batch config.json SESSION [SESSION ...] [-o OUT] [--workers N] [--backend B] [--psd]
+
+Every continuous.dat under each session folder is processed with the probe
+and filter settings of a config file saved from the web app: all TTL event
+snapshots are computed in parallel, then written to disk along with the
+running average (and SEM) of every event group. No browser, no acquisition.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from model import Model
+from recompute import RecomputeEngine
+from event_stats import RunningStats
+
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_model(config, continuous):
+    """Model set up from a saved config, reading `continuous`."""
+    probe = config.get("probe setting", {})
+    nbr_col = probe.get("probe column", 96)
+    nbr_row = probe.get("probe row", 32)
+    model = Model(
+        nbr_col * nbr_row, nbr_col, nbr_row,
+        probe.get("display divider column", 4), probe.get("display divider row", 4),
+        precision=probe.get("compute precision", "float64"),
+    )
+    model.file = continuous
+
+    filters = config.get("filter setting", {})
+    model.filter_backend = filters.get("filter backend", "sos")
+    model.configure_denoise(filters.get("denoise method", "svd"), filters.get("denoise refit", 0))
+    notch_freq = [(n["frequency"], n["harmonic"]) for n in filters.get("notch filter", [])]
+    model.setup_filters(
+        filters.get("low frequency band", 1), filters.get("high frequency band", 200),
+        filters.get("order", 4), notch_freq, filters.get("denoise", False),
+    )
+    model.reset_xy(config.get("event duration", 100))
+
+    budget = config.get("event memory budget", 512)
+    model.set_event_memory_budget(budget * 2**20 if budget else None)
+    return model
+
+
+def find_recordings(session, stream=None):
+    """continuous.dat files under `session`, optionally only streams whose folder contains `stream`."""
+    files = sorted(Path(session).rglob("continuous.dat"))
+    if stream is not None:
+        files = [f for f in files if stream in f.parent.name]
+    return files
+
+
+def read_ttl_events(continuous, lines=None):
+    """
+    Rising TTL edges of the recording of `continuous`, as file sample indices.
+
+    Open Ephys stores them next to the continuous stream, in
+    recordingN/events/<stream>/TTL: sample_numbers.npy and states.npy
+    (+line / -line, 1-based, for rising / falling edges). Sample numbers
+    count from the start of acquisition, so the stream's first sample
+    number is subtracted. `lines` is a boolean mask of the 0-based lines to keep.
+
+    Returns
+    -------
+    indices, sample_numbers, event_lines : np.ndarray
+    """
+    stream_dir = continuous.parent
+    events_dir = stream_dir.parent.parent / "events"
+    ttl_dirs = sorted((events_dir / stream_dir.name).glob("TTL*")) or sorted(events_dir.glob("*/TTL*"))
+    if not ttl_dirs:
+        raise FileNotFoundError(f"No TTL events found for {continuous}")
+
+    ttl = ttl_dirs[0]
+    sample_numbers = np.load(ttl / "sample_numbers.npy").astype(np.int64)
+    states = np.load(ttl / "states.npy").astype(np.int64)
+
+    rising = states > 0
+    sample_numbers = sample_numbers[rising]
+    event_lines = states[rising] - 1
+    if lines is not None:
+        lines = np.asarray(lines, dtype=bool)
+        keep = (event_lines < len(lines)) & lines[np.clip(event_lines, 0, len(lines) - 1)]
+        sample_numbers, event_lines = sample_numbers[keep], event_lines[keep]
+
+    first_sample = 0
+    stream_samples = stream_dir / "sample_numbers.npy"
+    if stream_samples.exists():
+        first_sample = int(np.load(stream_samples, mmap_mode="r")[0])
+
+    return sample_numbers - first_sample, sample_numbers, event_lines
+
+
+def process_recording(continuous, config, out_dir, workers=None, psd=False, backend=None):
+    started = time.time()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    model = build_model(config, continuous)
+    model.data_event.spill_dir = out_dir
+    model.data_psd.spill_dir = out_dir
+    if workers:
+        model.filter_workers = workers
+
+    available = model.get_reader().available_samples()
+    triggers = config.get("event trigger setting")
+    indices, sample_numbers, event_lines = read_ttl_events(continuous, triggers)
+
+    # Only windows lying entirely in the recording give full-length snapshots
+    inside = (indices >= model.snapshot_len) & (indices + model.snapshot_len <= available)
+    if not inside.all():
+        print(f"{continuous}: skipping {int((~inside).sum())} event(s) too close to the recording edges")
+    indices, sample_numbers, event_lines = indices[inside], sample_numbers[inside], event_lines[inside]
+    print(f"{continuous}: {len(indices)} events")
+
+    engine = RecomputeEngine(max_workers=workers, backend=backend or config.get("recompute backend", "thread"))
+    try:
+        engine.run(model, indices)
+
+        # Groups saved from the web app hold the events' raw TTL sample numbers
+        groups = {"Average": np.arange(len(indices))}
+        position = {ts: i for i, ts in enumerate(sample_numbers.tolist())}
+        for name, members in config.get("special_events", {}).items():
+            if name == "Average":
+                continue
+            found = [position[ts] for ts in members if ts in position]
+            if len(found) < len(members):
+                print(f"{continuous}: group {name}: {len(members) - len(found)} of {len(members)} event(s) not found")
+            if found:
+                groups[name] = np.asarray(found)
+
+        np.save(out_dir / "time_ms.npy", model.x)
+        outputs = [("", lambda: (model.data_event[ts] for ts in indices))]
+        if psd:
+            freqs, psds = model.get_event_psds(indices)
+            np.save(out_dir / "psd_freqs.npy", freqs)
+            outputs.append(("_psd", lambda: iter(psds)))
+
+        averages = {}
+        for suffix, snapshots in outputs:
+            stored = None
+            for i, snapshot in enumerate(snapshots()):
+                if stored is None:
+                    stored = np.lib.format.open_memmap(out_dir / f"snapshots{suffix}.npy", mode="w+",
+                                                       dtype=model.precision, shape=(len(indices),) + snapshot.shape)
+                stored[i] = snapshot
+            if stored is None:
+                continue
+            stored.flush()
+
+            for name, members in groups.items():
+                stats = RunningStats()
+                for i in members:
+                    stats.add(i, stored[i])
+                averages[f"{name}{suffix}_mean"] = stats.mean.astype(model.precision)
+                averages[f"{name}{suffix}_sem"] = stats.sem().astype(model.precision)
+            del stored
+
+        np.save(out_dir / "event_samples.npy", sample_numbers)
+        np.save(out_dir / "event_lines.npy", event_lines)
+        np.savez(out_dir / "averages.npz", **averages)
+
+        summary = {
+            "continuous": str(continuous),
+            "events": int(len(indices)),
+            "groups": {name: int(len(members)) for name, members in groups.items()},
+            "cells": {
+                "rows": model.nbr_row // model.row_divider,
+                "columns": model.nbr_col // model.col_divider,
+                "order": "row-major",
+            },
+            "fs": model.fs,
+            "psd": psd,
+            "seconds": round(time.time() - started, 2),
+            "config": config,
+        }
+        with open(out_dir / "summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+    finally:
+        engine.close()
+        model.close()
+
+    print(f"{continuous}: written to {out_dir} in {time.time() - started:.1f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute event snapshots and averages of recorded sessions without the web app.")
+    parser.add_argument("config", help="config .json saved from the web app")
+    parser.add_argument("sessions", nargs="+", help="recorded session folders")
+    parser.add_argument("-o", "--out", help="output folder (default: <session>/neurolayer_batch)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="filter threads, or worker processes with --backend process (default: all cores)")
+    parser.add_argument("--backend", choices=["thread", "process"],
+                        help="recompute backend (default: the config's \"recompute backend\", else thread)")
+    parser.add_argument("--stream", help="only process streams whose folder name contains this")
+    parser.add_argument("--psd", action="store_true", help="also write the PSD of every snapshot and group")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    failed = 0
+    for session in args.sessions:
+        session = Path(session)
+        recordings = find_recordings(session, args.stream)
+        if not recordings:
+            print(f"{session}: no continuous.dat found")
+            failed += 1
+            continue
+
+        base = Path(args.out) / session.name if args.out else session / "neurolayer_batch"
+        for continuous in recordings:
+            out_dir = base if len(recordings) == 1 else base / continuous.parent.relative_to(session)
+            try:
+                process_recording(continuous, config, out_dir, workers=args.workers, psd=args.psd,
+                                  backend=args.backend)
+            except Exception as e:
+                # keep going through the other sessions
+                print(f"{continuous}: failed: {e}")
+                failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
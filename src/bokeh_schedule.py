@@ -0,0 +1,10 @@
+def schedule(model, callback):
+    """
+    Run `callback` (Bokeh model changes) on the document's event loop once
+    `model` is displayed, or right away while it has no document.
+    """
+    doc = model.document if model is not None else None
+    if doc is None:
+        callback()
+    else:
+        doc.add_next_tick_callback(callback)
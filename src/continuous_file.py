@@ -0,0 +1,75 @@
+import os
+import numpy as np
+
+
+class ContinuousFile:
+    """
+    Memory-mapped reader over an Open Ephys `continuous.dat` file.
+
+    The file holds interleaved samples (one int16 per channel per sample).
+    The map is re-created only when the file has grown past the mapped
+    length, so repeated reads of past data come from the page cache.
+    """
+
+    def __init__(self, path, nbr_row, nbr_col, dtype=np.int16):
+        self.path = path
+        self.nbr_row = nbr_row
+        self.nbr_col = nbr_col
+        self.dtype = np.dtype(dtype)
+        self.bytes_per_sample = self.dtype.itemsize * nbr_row * nbr_col
+        self._map = None
+
+    @property
+    def mapped_samples(self):
+        return 0 if self._map is None else self._map.shape[0]
+
+    def available_samples(self):
+        """Number of complete samples currently on disk."""
+        try:
+            return os.path.getsize(self.path) // self.bytes_per_sample
+        except OSError:
+            return 0
+
+    def remap(self):
+        n_samples = self.available_samples()
+        if n_samples > self.mapped_samples:
+            self._map = np.memmap(
+                self.path, dtype=self.dtype, mode="r",
+                shape=(n_samples, self.nbr_row, self.nbr_col)
+            )
+        return self.mapped_samples
+
+    def view(self, start_sample, stop_sample):
+        """
+        Return a zero-copy (samples, rows, cols) view of [start_sample, stop_sample).
+        The view is truncated if the file does not yet hold all requested samples.
+        """
+        if stop_sample > self.mapped_samples:
+            self.remap()
+        if self._map is None:
+            return np.zeros((0, self.nbr_row, self.nbr_col), dtype=self.dtype)
+        start_sample = min(start_sample, self.mapped_samples)
+        return self._map[start_sample:stop_sample]
+
+    def gather(self, starts, n_samples, out=None):
+        """
+        Copy the windows [start, start + n_samples) of every start into one
+        (windows, samples, rows, cols) block with a single fancy-indexed read.
+        Every window must lie within the file.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        if out is None:
+            out = np.empty((len(starts), n_samples, self.nbr_row, self.nbr_col), dtype=self.dtype)
+        if len(starts) == 0:
+            return out
+
+        stop_sample = int(starts.max()) + n_samples
+        if stop_sample > self.mapped_samples:
+            self.remap()
+        if starts.min() < 0 or stop_sample > self.mapped_samples:
+            raise ValueError(f"Windows [{starts.min()}, {stop_sample}) exceed the {self.mapped_samples} samples of '{self.path}'")
+
+        # Bounds are checked above, so skip take's per-index check ("clip" never clips here)
+        index = starts[:, None] + np.arange(n_samples)
+        np.take(np.asarray(self._map), index, axis=0, out=out, mode="clip")
+        return out
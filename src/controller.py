@@ -1,6 +1,10 @@
 from model import Model
+from decimation import minmax_decimate, minmax_decimate_aligned, log_bin
+from recompute import RecomputeEngine
+from event_stats import RunningStats
 from datetime import datetime
 from pathlib import Path
+import os
 import threading
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
@@ -19,6 +23,9 @@ class Controller:
         self.nbr_event_received = 0
         self.events= dict()
         self.special_events= dict(Average=[])
+        self.group_stats = dict()  # running mean / variance per special event
+        self.group_psd_stats = dict()  # running mean / variance of the event PSDs per special event
+        self._stats_lock = threading.Lock()
         self.register_line = np.zeros(32)
         self.register_line[0] = 1
         self.event_duration = 100
@@ -27,11 +34,28 @@ class Controller:
         self.order = 4
         self.notch_freq = []
         self.denoise = False
+        self.denoise_method = "svd"  # "svd", or a reusable spatial basis: "calibration" / "running"
+        self.denoise_refit = 0       # windows between basis refits, 0 = never (calibration)
+        self.filter_backend = "sos"  # zero-phase filtering: "sos" (sosfiltfilt) or "fft"
+        self.filter_workers = os.cpu_count() or 1  # threads sharing the channels of one filter call, 1 = serial
+        self.recompute_backend = "thread"  # bulk snapshot recomputes: "thread" (batched, GIL-free) or "process"
+        self.psd = False
+        self.psd_log_bins = 0  # log-frequency bands per PSD trace, 0 = full Welch resolution
+        self.precision = "float64"
+        self.event_memory_budget = 512  # MB of event snapshots and their PSDs kept in RAM, 0 for unlimited
 
         self.executor = ThreadPoolExecutor(max_workers=1)
+        self.background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        self.recompute = RecomputeEngine(backend=self.recompute_backend)
+        self._generations = dict()  # job kind -> generation of its newest submission
+        self._jobs_lock = threading.Lock()
 
     def close(self):
         self.executor.shutdown(wait=False)
+        self.background.shutdown(wait=False, cancel_futures=True)
+        self.recompute.close()
+        if self.model is not None:
+            self.model.close()
 
     def set_view_callback(self, view):
         self.view = view 
@@ -41,21 +65,30 @@ class Controller:
         self.events= dict()
         self.nbr_event_received = 0
         self.special_events= dict(Average=[])
-        self.model.data_event = dict()
+        self.model.data_event.clear()
+        self.model.data_psd.clear()
+        self.invalidate_group_stats()
         
         self.data_folder= datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         self.model.data_path = Path(self.selected_folder) / self.data_folder
+        self.model.data_event.spill_dir = self.model.data_path
+        self.model.data_psd.spill_dir = self.model.data_path
         self.model.file = None
 
         print(f"Desktop path: {self.model.data_path}")
 
         self.view.clear_events()
+        self._configure_filters()
         self.model.setup_filters(self.lc,self.hc, self.order, self.notch_freq, self.denoise)
 
         return self.selected_folder, self.data_folder
 
     def setup_event_view(self, num_channel, nb_col, nb_line, col_divider, row_divider):
-        self.model = Model(num_channel, nb_col, nb_line, col_divider, row_divider)
+        if self.model is not None:
+            self.model.close()
+        self.model = Model(num_channel, nb_col, nb_line, col_divider, row_divider, precision=self.precision)
+        self.update_event_memory_budget(self.event_memory_budget)
+        self.update_filter_workers(self.filter_workers)
         return self.model.reset_xy(self.event_duration)
 
     def add_event_line(self, line):
@@ -65,64 +98,121 @@ class Controller:
         self.register_line[line] = 0
 
     def add_event(self, info):
+        self.add_events([info])
 
-        if not self.register_line[info["line"]]:
-            print("Event from line " + str(info["line"]) + " ignored")
-            return 
+    def add_events(self, infos):
+        """Register a batch of TTL events and compute their snapshots in one background job."""
+        accepted = []
+        for info in infos:
+            if not self.register_line[info["line"]]:
+                print("Event from line " + str(info["line"]) + " ignored")
+                continue
 
-        self.nbr_event_received +=1
+            self.nbr_event_received +=1
 
-        if self.nbr_events != 0 and self.nbr_event_received > self.nbr_events:
-            return 
+            if self.nbr_events != 0 and self.nbr_event_received > self.nbr_events:
+                continue
 
-        print("Event occurred on TTL line " 
-                + str(info['line']) 
-                + " at " 
-                + str(info['sample_number'] / info['sample_rate']) 
-                + " seconds.")
+            print("Event occurred on TTL line " 
+                    + str(info['line']) 
+                    + " at " 
+                    + str(info['sample_number'] / info['sample_rate']) 
+                    + " seconds.")
+            accepted.append((info, self.nbr_event_received))
 
-        def add_event_in_thread(nbr_event_received):
-            self.model.add_event(info)
-
-            if self.nbr_events != 0 and nbr_event_received >= self.nbr_events:
-                self.view.stop_acquisition()
-
-            self.events[str(info['sample_number'])] = info['sample_number']
-            self.special_events["Average"].append(info['sample_number'])
-            self.view.add_dropdown_option(str(info['sample_number']))
+        if not accepted:
+            return
 
+        def add_events_in_thread(accepted):
+            # one read and one filter pass for the whole burst
+            self.model.add_events([info for info, _ in accepted], psd=self.psd)
+            for info, nbr_event_received in accepted:
+                if self.nbr_events != 0 and nbr_event_received >= self.nbr_events:
+                    self.view.stop_acquisition()
+
+                self.events[str(info['sample_number'])] = info['sample_number']
+                self.special_events["Average"].append(info['sample_number'])
+                self.view.add_dropdown_option(str(info['sample_number']))
+                print("finished computed event"+ str(info['sample_number']))
+
+            # fold the new snapshots into the running average once
+            if self.psd:
+                self.get_group_psd_stats("Average")
+            else:
+                self.get_group_stats("Average")
             if self.event_type == "Average":
                 self.view.update_sources()
-            print("finished computed event"+ str(info['sample_number']))
 
-        self.executor.submit(add_event_in_thread, self.nbr_event_received)
+        self.executor.submit(add_events_in_thread, accepted)
+
+    def submit_latest(self, kind, fn, executor=None):
+        """
+        Submit fn(cancelled) as the newest job of `kind`. Older jobs of the same
+        kind are skipped if still queued, and their cancelled() turns True if running.
+        """
+        with self._jobs_lock:
+            generation = self._generations.get(kind, 0) + 1
+            self._generations[kind] = generation
+
+        def cancelled():
+            return self._generations.get(kind) != generation
+
+        def run():
+            if cancelled():
+                return
+            try:
+                fn(cancelled)
+            except Exception as e:
+                print(f"{kind} job error: {e}")
+
+        return (executor or self.executor).submit(run)
 
     def update_psd(self, psd):
+        self.psd = psd
         
-        def update_():
-            if self.model is not None:
-                for value in self.events:
-                    self.model.compute_event(self.events[value], psd=psd)
-
+        def update_(cancelled):
+            # displayed snapshots are recomputed on demand by get_data_event
             self.view.update_sources()
-        self.executor.submit(update_)
+            self._schedule_background_refresh()
+        self.submit_latest("psd", update_)
+
+    def update_psd_log_bins(self, n_bins):
+        self.psd_log_bins = n_bins
+        if self.psd:
+            self.submit_latest("psd", lambda cancelled: self.view.update_sources())
 
     def update_nbr_events(self, new):
         self.nbr_events = new
 
+    def update_event_memory_budget(self, megabytes):
+        self.event_memory_budget = megabytes
+        if self.model is not None:
+            self.model.set_event_memory_budget(megabytes * 2**20 if megabytes else None)
+
+    def update_filter_workers(self, workers):
+        self.filter_workers = max(1, int(workers))
+        if self.model is not None:
+            self.model.filter_workers = self.filter_workers
+
+    def update_recompute_backend(self, backend):
+        self.recompute_backend = backend
+        self.recompute.backend = backend
+        if backend != "process":
+            # the worker processes are not needed anymore
+            self.recompute.close()
+
     def update_snapshot(self, event_duration):
         self.event_duration = event_duration
 
-        def update_():
+        def update_(cancelled):
             if self.model is not None:
                 self.model.reset_xy(event_duration)
-                for value in self.events:
-                    self.model.compute_event(self.events[value])
 
             self.view.update_sources()
-        self.executor.submit(update_)
+            self._schedule_background_refresh()
+        self.submit_latest("snapshot", update_)
     
-    def update_filter(self, lc=None, hc=None, order=None, notch_freq=None, denoise=False):
+    def update_filter(self, lc=None, hc=None, order=None, notch_freq=None, denoise=False, denoise_method=None, denoise_refit=None, filter_backend=None):
         if order is not None:
             self.order = order
 
@@ -135,62 +225,239 @@ class Controller:
         if notch_freq is not None: 
             self.notch_freq = notch_freq
 
+        if denoise_method is not None:
+            self.denoise_method = denoise_method
+
+        if denoise_refit is not None:
+            self.denoise_refit = denoise_refit
+
+        if filter_backend is not None:
+            self.filter_backend = filter_backend
+
         self.denoise = denoise
         if self.model is None: 
             return
 
+        self._configure_filters()
         self.model.setup_filters(self.lc,self.hc, self.order, self.notch_freq, self.denoise)
 
-        def update_():
-            
-            try: 
-                for value in self.events:
-                    self.model.compute_event(self.events[value])
-
-            except Exception as e: 
-                print(str(e))
-
+        def update_(cancelled):
             self.view.update_sources()
+            self._schedule_background_refresh()
         
-        self.executor.submit(update_)
-
-
-    def get_data_event(self, psd=False):
+        self.submit_latest("filter", update_)
+
+    def _configure_filters(self):
+        self.model.filter_backend = self.filter_backend
+        self.model.configure_denoise(self.denoise_method, self.denoise_refit)
+
+    def ensure_fresh(self, timestamps, psd=False, cancelled=None, on_result=None):
+        """
+        Recompute (in parallel) the snapshots of `timestamps` made with outdated settings.
+        on_result(ts) is called as each recomputed snapshot lands.
+        Returns False if the settings changed again, or cancelled() turned True,
+        before all were done.
+        """
+        stale = [ts for ts in timestamps if not self.model.is_fresh(ts, psd)]
+        if not stale:
+            return True
+        version = self.model.snapshot_version(psd)
+
+        def superseded():
+            return self.model.snapshot_version(psd) != version or (cancelled is not None and cancelled())
+
+        return self.recompute.run(self.model, stale, psd=psd, on_result=on_result, cancelled=superseded)
+
+    def _schedule_background_refresh(self):
+        """Bring every other event up to date, batch by batch, until settings change again."""
+        if self.model is None:
+            return
+        psd = self.psd
+        version = self.model.snapshot_version(psd)
+
+        def refresh_(cancelled):
+            stale = [ts for ts in list(self.events.values()) if not self.model.is_fresh(ts, psd)]
+            # stops between batches once newer settings supersede these
+            self.recompute.run(self.model, stale, psd=psd,
+                               cancelled=lambda: cancelled() or self.model.snapshot_version(psd) != version)
+
+        self.submit_latest("background", refresh_, executor=self.background)
+
+    def get_group_stats(self, name, psd=False, cancelled=None, on_partial=None):
+        """Running stats of a special event, folding in only snapshots not seen yet."""
+        return self._get_running_stats(self.group_stats, name, psd, cancelled, on_partial,
+                                       lambda new: (self.model.data_event[ts] for ts in new))
+
+    def get_group_psd_stats(self, name, cancelled=None, on_partial=None):
+        """Running mean of the event PSDs of a special event; new members are transformed in one batch."""
+        return self._get_running_stats(self.group_psd_stats, name, True, cancelled, on_partial,
+                                       lambda new: self.model.get_event_psds(new)[1])
+
+    def _get_running_stats(self, table, name, psd, cancelled, on_partial, read):
+        """
+        Running stats of special event `name` kept in `table`; read(timestamps)
+        gives the arrays of members not folded in yet. Outdated members are
+        recomputed first. With on_partial, each one is folded in as it lands
+        and on_partial(stats) is called with the average so far.
+        """
+        all_ts = self.special_events[name]
+        version = self.model.snapshot_version(psd)
+
+        def fold(timestamps):
+            with self._stats_lock:
+                stats = table.get(name)
+                if stats is None or stats.version != version or not stats.members.issubset(all_ts):
+                    stats = RunningStats(version)
+                    table[name] = stats
+                new = [ts for ts in timestamps if ts not in stats.members]
+                if new:
+                    for ts, value in zip(new, read(new)):
+                        stats.add(ts, value)
+                return stats
+
+        on_result = None
+        if on_partial is not None:
+            def on_result(ts):
+                on_partial(fold([ts]))
+
+            fresh = fold([ts for ts in all_ts if self.model.is_fresh(ts, psd)])
+            if fresh.count and fresh.count < len(all_ts):
+                on_partial(fresh)
+
+        if not self.ensure_fresh(all_ts, psd, cancelled, on_result):
+            return None
+        return fold(all_ts)
+
+    def invalidate_group_stats(self):
+        """Drop running stats, e.g. when a new session starts."""
+        with self._stats_lock:
+            self.group_stats.clear()
+            self.group_psd_stats.clear()
+
+    def get_data_event(self, psd=False, max_points=None, sem=False, cancelled=None, on_partial=None):
+        """
+        Return (x, y, band) for the selected event or group average.
+        Snapshots computed with outdated settings are recomputed first; if the
+        settings change meanwhile, (None, None, None) is returned.
+        band is (mean - SEM, mean + SEM) when sem is requested for a group, else None.
+        While a group's snapshots are recomputed, on_partial(x, y, band) is
+        called with the average of the members done so far.
+        """
+        group = self.event_type in self.special_events and len(self.special_events[self.event_type]) != 0
+        on_stats = None
+        if group and on_partial is not None:
+            def on_stats(stats):
+                on_partial(*self._group_view(stats, psd, sem, max_points))
+
+        if psd:
+            x, y = self._get_psd_event(cancelled, on_stats)
+            if x is None:
+                return None, None, None
+            return x, y, None
+
+        band = None
         
         if self.event_type in self.events:
+            ts = self.events[self.event_type]
+            if not self.ensure_fresh([ts], psd, cancelled):
+                return None, None, None
             x = self.model.x
-            y = self.model.data_event[self.events[self.event_type]]
+            y = self.model.data_event[ts]
         
-        elif self.event_type in self.special_events:
-
-            all_ts = self.special_events[self.event_type]
-            
-            if len(all_ts) != 0: 
-                d = []
-                
-                for ts in all_ts: 
-                    d.append(self.model.data_event[ts])
-
-                d = np.stack(d)
-                y = np.mean(d, axis=0)
-                x = self.model.x
+        elif group:
+            stats = self.get_group_stats(self.event_type, psd, cancelled, on_stats)
+            if stats is None:
+                return None, None, None
+            return self._group_view(stats, psd, sem, max_points)
 
         else:
             x, y = self.model.reset_xy(self.event_duration)
         
-        print(y.shape)
-        if psd: 
-            x, y = self.model.compute_psd_with_hanning(y)
-
-        return x, y
-
+        x = np.asarray(x)
+        x, y = minmax_decimate(x, np.asarray(y), max_points, axis=-1)
+
+        return x, y, band
+
+    def _group_view(self, stats, psd, sem, max_points):
+        """(x, y, band) shown for the running stats of a group."""
+        y = stats.mean.astype(self.model.precision)
+        if psd:
+            return (*self._psd_db(self.model.psd_freqs(), y), None)
+
+        x = np.asarray(self.model.x)
+        band = None
+        if sem:
+            err = stats.sem().astype(self.model.precision)
+            band = tuple(minmax_decimate(x, b, max_points, axis=-1)[1] for b in (y - err, y + err))
+        x, y = minmax_decimate(x, y, max_points, axis=-1)
+        return x, y, band
+
+    def _get_psd_event(self, cancelled=None, on_stats=None):
+        """(freqs, psd_db) of the selected event, or the mean PSD of a group; (None, None) if superseded."""
+        if self.event_type in self.events:
+            ts = self.events[self.event_type]
+            if not self.ensure_fresh([ts], psd=True, cancelled=cancelled):
+                return None, None
+            x, psds = self.model.get_event_psds([ts])
+            y = psds[0]
+
+        elif self.event_type in self.special_events and len(self.special_events[self.event_type]) != 0:
+            stats = self.get_group_psd_stats(self.event_type, cancelled, on_stats)
+            if stats is None:
+                return None, None
+            x = self.model.psd_freqs()
+            y = stats.mean.astype(self.model.precision)
 
-    def get_full_data(self, psd):
+        else:
+            _, y = self.model.reset_xy(self.event_duration)
+            x, y = self.model.compute_psd(y)
+
+        return self._psd_db(x, y)
+
+    def _psd_db(self, x, y):
+        # average linear power within bands, then convert
+        x, y = log_bin(x, y, self.psd_log_bins, axis=-1)
+        with np.errstate(divide="ignore"):
+            return x, 10 * np.log10(y)
+
+
+    def get_live_update(self, channels, since=None, max_points=None):
+        """
+        Time-domain data for the live view, as (x, y, end_sample, delta).
+
+        With the causal live filter (and no denoise), samples are final once
+        filtered: only those from absolute sample `since` onward are returned,
+        and delta is True. They are decimated to min/max pairs over bins
+        aligned on the sample index, sized so the whole buffer fits in
+        max_points; only complete bins are sent, end_sample is where the next
+        update picks up. Otherwise the whole decimated buffer is returned with
+        delta False and end_sample None.
+        """
+        model = self.model
+        if model is None:
+            return None, None, None, False
+
+        if model.live_filter_mode == "causal" and model.sos_all is not None and not model.denoise:
+            start, x, y = model.get_live_signal(channels, since)
+            bin_size = 1
+            if max_points is not None and max_points >= 2:
+                bin_size = -(-model.max_buffer_samples // (max_points // 2))  # ceil
+            x, y, end = minmax_decimate_aligned(x, y, start, bin_size, axis=0)
+            return x, y, end, since is not None and start == since
+
+        x, y = self.get_full_data(False, channels, max_points)
+        return x, y, None, False
+
+    def get_full_data(self, psd, channels=None, max_points=None):
         if self.model is None: 
             return None, None
 
-        x, y = self.model.get_full_signal(psd)
-        
+        if psd:
+            # a few hundred frequency bins per trace, nothing to decimate
+            return self.model.get_live_psd(channels)
+
+        x, y = self.model.get_full_signal(psd, channels)
+        x, y = minmax_decimate(x, y, max_points, axis=0)
         return x, y
 
 
@@ -21,6 +21,7 @@ class DataStream(threading.Thread):
         self.socket.connect(self.url)
         self.socket.setsockopt(zmq.SUBSCRIBE, b"")
 
+        self.poll_timeout = 100  # ms, bounds how long stop() waits for the listener
         self.stop_event = threading.Event()
         self.start()
 
@@ -42,19 +43,37 @@ class DataStream(threading.Thread):
         """
 
         print("Starting EventListener")
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+
         while not self.stop_event.is_set():
             try:
-                parts = self.socket.recv_multipart(flags=zmq.NOBLOCK)
-                
-                if len(parts) == 2:
-
-                    info = json.loads(parts[1].decode("utf-8"))
-                    if info["state"]:
-                        self.controller.add_event(info)
-
-            except zmq.Again:
-                # No message received
-                pass
+                # Sleep until a message arrives (or timeout to check stop_event)
+                if not poller.poll(self.poll_timeout):
+                    continue
+
+                # Drain everything pending and hand it over as one batch
+                infos = []
+                while True:
+                    try:
+                        parts = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+                    except zmq.Again:
+                        # No message left
+                        break
+
+                    if len(parts) == 2:
+
+                        info = json.loads(parts[1].decode("utf-8"))
+                        if info["state"]:
+                            infos.append(info)
+
+                if infos:
+                    self.controller.add_events(infos)
+
+            except zmq.ZMQError as e:
+                if self.stop_event.is_set():
+                    break
+                print("EventListener error:", e)
             except KeyboardInterrupt:
                 print()  # Add final newline
                 break
@@ -86,6 +105,8 @@ class DataStream(threading.Thread):
     def stop(self):
         self.gui.idle()
         self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=2 * self.poll_timeout / 1000)
         self.socket.close()
         self.context.term()
 
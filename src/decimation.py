@@ -0,0 +1,141 @@
+import numpy as np
+
+
+def minmax_decimate(x, y, max_points, axis=-1):
+    """
+    Reduce traces to a min/max envelope of at most `max_points` samples.
+
+    The sample axis of `y` is cut into max_points // 2 bins and each bin is
+    replaced by its minimum and maximum, kept in time order so peaks are not
+    lost. All traces (every other axis of `y`) are reduced at once and share
+    the returned time axis.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        1D time axis, same length as the sample axis of y.
+    y : np.ndarray
+        Traces, samples along `axis`.
+    max_points : int
+        Maximum number of samples to keep, typically twice the pixel width.
+
+    Returns
+    -------
+    x, y : np.ndarray
+        Decimated time axis and traces (unchanged if already short enough).
+    """
+    n_samples = y.shape[axis]
+    if max_points is None or n_samples <= max_points or max_points < 2:
+        return x, y
+
+    n_bins = max_points // 2
+    bin_size = -(-n_samples // n_bins)  # ceil
+    pad = n_bins * bin_size - n_samples
+
+    y = np.moveaxis(y, axis, -1)
+    if pad:
+        y = np.pad(y, [(0, 0)] * (y.ndim - 1) + [(0, pad)], mode="edge")
+        x = np.pad(x, (0, pad), mode="edge")
+    x_out, out = _minmax_bins(x, y, bin_size)
+    return x_out, np.moveaxis(out, -1, axis)
+
+
+def minmax_decimate_aligned(x, y, start_sample, bin_size, axis=-1):
+    """
+    Min/max envelope over bins of `bin_size` samples aligned on the absolute
+    sample index, for streams decimated piece by piece.
+
+    Bin k covers samples [k * bin_size, (k + 1) * bin_size), so a bin holds
+    the same samples whichever piece it is computed from. Only complete
+    bins are returned: samples before the first bin boundary of the piece,
+    and after the last one, are left out. The next piece should start at
+    the returned end_sample, and then adds bins that are final.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        1D time axis, same length as the sample axis of y.
+    y : np.ndarray
+        Traces, samples along `axis`.
+    start_sample : int
+        Absolute sample index of the first sample of y.
+    bin_size : int
+        Samples per bin; 1 returns every sample.
+
+    Returns
+    -------
+    x, y : np.ndarray
+        Decimated time axis and traces, two points per complete bin.
+    end_sample : int
+        Absolute index just after the last complete bin (start_sample if there is none).
+    """
+    n_samples = y.shape[axis]
+    if bin_size <= 1:
+        return x, y, start_sample + n_samples
+
+    first = -(-start_sample // bin_size) * bin_size  # ceil to a bin boundary
+    end_sample = (start_sample + n_samples) // bin_size * bin_size
+    if end_sample < first:
+        # no complete bin yet
+        first = end_sample = start_sample
+    keep = slice(first - start_sample, end_sample - start_sample)
+
+    y = np.moveaxis(y, axis, -1)[..., keep]
+    x_out, out = _minmax_bins(np.asarray(x)[keep], y, bin_size)
+    return x_out, np.moveaxis(out, -1, axis), end_sample
+
+
+def _minmax_bins(x, y, bin_size):
+    """Min/max pairs of every bin of `bin_size` samples along the last axis of y (a whole number of bins)."""
+    n_bins = y.shape[-1] // bin_size
+    binned = y.reshape(y.shape[:-1] + (n_bins, bin_size))
+
+    i_min = np.argmin(binned, axis=-1)
+    i_max = np.argmax(binned, axis=-1)
+    v_min = np.take_along_axis(binned, i_min[..., None], axis=-1)[..., 0]
+    v_max = np.take_along_axis(binned, i_max[..., None], axis=-1)[..., 0]
+
+    min_first = i_min <= i_max
+    out = np.empty(y.shape[:-1] + (n_bins, 2), dtype=y.dtype)
+    out[..., 0] = np.where(min_first, v_min, v_max)
+    out[..., 1] = np.where(min_first, v_max, v_min)
+    out = out.reshape(y.shape[:-1] + (2 * n_bins,))
+
+    # Both points of a bin are drawn at the bin start and bin centre
+    x_bins = x.reshape(n_bins, bin_size)
+    x_out = np.stack((x_bins[:, 0], x_bins[:, bin_size // 2]), axis=-1).reshape(-1)
+    return x_out, out
+
+
+def log_bin(x, y, n_bins, axis=-1):
+    """
+    Average spectra into `n_bins` log-spaced frequency bands.
+
+    Bands span the first non-zero frequency of `x` to its last one, so low
+    frequencies keep their resolution while the many high-frequency bins
+    are merged. Empty bands are dropped and the DC bin is discarded. All
+    spectra (every other axis of `y`) share the bands. Average linear
+    power, convert to dB afterwards.
+
+    Returns
+    -------
+    x, y : np.ndarray
+        Mean frequency of each band and band-averaged spectra (unchanged if
+        already short enough).
+    """
+    x = np.asarray(x)
+    positive = np.flatnonzero(x > 0)
+    if not n_bins or len(positive) <= n_bins:
+        return x, y
+
+    x = x[positive]
+    y = np.take(y, positive, axis=axis)
+    edges = np.geomspace(x[0], x[-1], n_bins + 1)
+    band = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_bins - 1)
+    starts = np.flatnonzero(np.r_[True, band[1:] != band[:-1]])
+    counts = np.diff(np.r_[starts, len(x)])
+
+    x_out = np.add.reduceat(x, starts) / counts
+    y = np.moveaxis(y, axis, -1)
+    y_out = np.add.reduceat(y, starts, axis=-1) / counts
+    return x_out, np.moveaxis(y_out, -1, axis)
@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from sklearn.utils.extmath import randomized_svd
+
+from lock_pickling import LockPickling
+
+
+class SpatialDenoiser(LockPickling):
+    """
+    Common-mode denoising by projection on a learned spatial basis.
+
+    The top `n_components` right singular vectors of (samples, channels)
+    data span the activity shared across the probe. They are learned once
+    with a randomized SVD and reused, so denoising a window is two matmuls.
+
+    mode="calibration" fits the basis on the first window seen (or the one
+    passed to `fit`), then refits every `refit_every` windows (0 = never).
+    mode="running" keeps a rank-limited sketch of all windows seen, with
+    older data down-weighted by `forget`, and updates the basis every
+    `refit_every` windows (at least every window when 0).
+
+    `denoise` follows the stream, so its basis depends on the windows seen
+    before. `epoch_basis` instead gives the basis of a fixed epoch of the
+    recording, for results that must not depend on the order they are
+    computed in; in running mode it looks back `history` epochs at most.
+    """
+
+    def __init__(self, n_components=5, mode="calibration", refit_every=0, forget=0.9, history=8, max_cached=256):
+        self.n_components = n_components
+        self.mode = mode
+        self.refit_every = refit_every
+        self.forget = forget
+        self.history = history
+        self.max_cached = max_cached  # epoch bases and window sketches kept, each
+
+        self.components = None   # (n_components, channels)
+        self._sketch = None      # singular values * components of the running estimate
+        self._calls = 0
+        self._epochs = OrderedDict()           # epoch -> components, least recently used first
+        self._window_sketches = OrderedDict()  # epoch -> sketch of its calibration window alone
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.components = None
+            self._sketch = None
+            self._calls = 0
+            self._epochs.clear()
+            self._window_sketches.clear()
+
+    @property
+    def fitted(self):
+        return self.components is not None
+
+    def fit(self, data):
+        """Learn the basis from a (samples, channels) calibration window."""
+        _, s, vt = randomized_svd(data, self.n_components, random_state=0)
+        with self._lock:
+            self.components = vt.astype(data.dtype, copy=False)
+            self._sketch = s[:, None] * vt
+
+    def _fold(self, sketch, data):
+        """(components, sketch) of `data` stacked under the down-weighted `sketch`."""
+        stacked = data if sketch is None else np.vstack((np.sqrt(self.forget) * sketch.astype(data.dtype), data))
+        _, s, vt = randomized_svd(stacked, self.n_components, random_state=0)
+        return vt.astype(data.dtype, copy=False), s[:, None] * vt
+
+    def _update_running(self, data):
+        with self._lock:
+            sketch = self._sketch
+        components, sketch = self._fold(sketch, data)
+        with self._lock:
+            self.components = components
+            self._sketch = sketch
+
+    def epoch_basis(self, epoch, read_window):
+        """
+        Basis of `epoch` of a recording, whatever order epochs are asked in.
+        read_window(k) returns the (samples, channels) calibration window of epoch k.
+        mode="calibration" fits each epoch on its own window. mode="running"
+        combines the sketches of the windows of the last `history` epochs,
+        older ones down-weighted by `forget` as the stream would; each window
+        is sketched once, so consecutive epochs share all but one.
+        """
+        with self._lock:
+            if epoch in self._epochs:
+                self._epochs.move_to_end(epoch)
+                return self._epochs[epoch]
+
+        if self.mode != "running":
+            components, _ = self._fold(None, read_window(epoch))
+        else:
+            epochs = range(max(0, epoch - self.history + 1), epoch + 1)
+            weights = np.sqrt(self.forget) ** (epoch - np.array(epochs))
+            stacked = np.vstack([w * self._window_sketch(k, read_window) for k, w in zip(epochs, weights)])
+            # a few rows per window: an exact SVD is cheap
+            _, _, vt = np.linalg.svd(stacked, full_matrices=False)
+            components = vt[:self.n_components].astype(stacked.dtype, copy=False)
+
+        with self._lock:
+            self._epochs[epoch] = components
+            self._trim(self._epochs)
+        return components
+
+    def _window_sketch(self, epoch, read_window):
+        with self._lock:
+            if epoch in self._window_sketches:
+                self._window_sketches.move_to_end(epoch)
+                return self._window_sketches[epoch]
+        data = read_window(epoch)
+        _, sketch = self._fold(None, data)
+        sketch = sketch.astype(data.dtype, copy=False)
+        with self._lock:
+            self._window_sketches[epoch] = sketch
+            self._trim(self._window_sketches)
+        return sketch
+
+    def _trim(self, cache):
+        while len(cache) > self.max_cached:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def project(data, components):
+        """Project (samples, channels) data on `components`."""
+        components = components.astype(data.dtype, copy=False)
+        return (data @ components.T) @ components
+
+    def _due(self):
+        with self._lock:
+            self._calls += 1
+            if self.components is None:
+                return True
+            every = self.refit_every if self.refit_every > 0 else (1 if self.mode == "running" else 0)
+            return every > 0 and self._calls % every == 0
+
+    def denoise(self, data):
+        """Project (samples, channels) data on the spatial basis, refitting if due."""
+        if self._due():
+            if self.mode == "running":
+                self._update_running(data)
+            else:
+                self.fit(data)
+        return self.project(data, self.components)
@@ -3,17 +3,19 @@ Panel + HoloViews port of your Bokeh EventView.
 
 Start with `panel serve event_panel_app.py`.
 """
-from holoviews.streams import Pipe
 import holoviews as hv
 import json, tempfile
 import base64
 import threading
+import time
 from functools import partial
 
 import os
 import numpy as np
 import panel as pn
 from timeseries_plotting import TimeseriesView
+from grid_renderer import GridRenderer
+from heatmap_renderer import HeatmapRenderer
 from controller import Controller
 from data_stream import DataStream
 import signal 
@@ -36,8 +38,11 @@ class EventViewPanel(pn.viewable.Viewer):
         self.ncols = 96
         self.row_divider = 4
         self.col_divider = 4
-        self.hv_layout = None    # holoviews Layout of plots
+        self.grid = None         # GridRenderer / HeatmapRenderer of the loaded probe view
         self.vline_pos = None    # position for vertical line if needed
+        self.max_points = 440    # samples sent per cell, ~2x the widest cell in pixels
+        self.frame_interval = 0.1  # s, minimum time between two grid refreshes
+        self._last_refresh = 0.0
 
         # ---------------------------
         # Widgets
@@ -52,6 +57,23 @@ class EventViewPanel(pn.viewable.Viewer):
         )
         self.spinner_nbr_events.param.watch(self._on_nbr_events_change, "value")
 
+        self.spinner_memory = pn.widgets.IntInput(
+            name="Event RAM budget (MB, 0 = unlimited)", value=controller.event_memory_budget, step=64, start=0, end=65536
+        )
+        self.spinner_memory.param.watch(self._on_memory_budget_change, "value")
+
+        self.spinner_workers = pn.widgets.IntInput(
+            name="Filter threads (1 = serial)", value=controller.filter_workers, step=1, start=1, end=256
+        )
+        self.spinner_workers.param.watch(self._on_filter_workers_change, "value")
+
+        self.recompute_backend = pn.widgets.Select(
+            name="Recompute backend",
+            options={"Threads": "thread", "Processes": "process"},
+            value=controller.recompute_backend,
+        )
+        self.recompute_backend.param.watch(self._on_recompute_backend_change, "value")
+
         # Event type dropdown
         self.dropdown = pn.widgets.Select(name="Event type", options=[controller.event_type, "Average"], value=controller.event_type, align="end")
         self.dropdown.param.watch(self._on_event_type_change, "value")
@@ -84,6 +106,11 @@ class EventViewPanel(pn.viewable.Viewer):
         self.lowcut_spin = pn.widgets.FloatInput(name="Low cutoff frequency", value=1, step=1, start=0.5, end=500)
         self.highcut_spin = pn.widgets.IntInput(name="High cutoff frequency", value=200, step=10, start=40, end=4000)
         self.order_spin = pn.widgets.IntInput(name="Order", value=4, step=1, start=1, end=100)
+        self.filter_backend = pn.widgets.Select(
+            name="Filter backend",
+            options={"IIR (sosfiltfilt)": "sos", "FFT (long windows)": "fft"},
+            value=controller.filter_backend,
+        )
         self.filter_apply_btn = pn.widgets.Button(name="Apply filters", button_type="primary")
         self.filter_apply_btn.on_click(self._apply_filters)
 
@@ -100,6 +127,11 @@ class EventViewPanel(pn.viewable.Viewer):
         self.ch_row_spin = pn.widgets.IntInput(name="Probe Rows", value=self.nrows, step=1, start=1, end=100)
         self.dis_col_spin = pn.widgets.IntInput(name="Divider column", value=self.col_divider, step=1, start=1, end=100)
         self.dis_row_spin = pn.widgets.IntInput(name="Divider row", value=self.row_divider, step=1, start=1, end=100)
+        self.precision_select = pn.widgets.Select(name="Compute precision", options=["float64", "float32"], value=controller.precision)
+        self.display_mode = pn.widgets.RadioButtonGroup(
+            name="Display", options={"Traces": "lines", "Heatmap": "heatmap"}, value="lines", button_type="primary"
+        )
+        self.display_mode.param.watch(self._on_display_mode_change, "value")
         self.load_button = pn.widgets.Button(name="Load probe view", button_type="primary", width=150, align="center")
         self.load_button.on_click(self._create_view_button)
 
@@ -108,6 +140,7 @@ class EventViewPanel(pn.viewable.Viewer):
         self.ch_row_spin.param.watch(self._on_ch_row_change, "value")
         self.dis_col_spin.param.watch(self._on_dis_col_change, "value")
         self.dis_row_spin.param.watch(self._on_dis_row_change, "value")
+        self.precision_select.param.watch(self._on_precision_change, "value")
 
         # Events checkboxes grid (32 checkboxes)
         self.event_checkboxes = [pn.widgets.Checkbox(name=f"Line {i}", value=(i==0)) for i in range(32)]
@@ -123,8 +156,22 @@ class EventViewPanel(pn.viewable.Viewer):
         # For created event groups we still track checkboxes like in original code
         self.PSD = pn.widgets.Checkbox(name=f"PSD", value=False, align="end")
         self.PSD.param.watch(self._update_psd, "value")
+
+        self.SEM = pn.widgets.Checkbox(name=f"SEM", value=False, align="end")
+        self.SEM.param.watch(self.update_sources, "value")
+
+        self.psd_log_bins = pn.widgets.IntInput(
+            name="PSD log bands (0 = all bins)", value=controller.psd_log_bins, step=8, start=0, end=512, align="end", width=160
+        )
+        self.psd_log_bins.param.watch(self._on_psd_log_bins_change, "value")
         
         self.denoise = pn.widgets.Checkbox(name=f"Denoise", value=False, align="end")
+        self.denoise_method = pn.widgets.Select(
+            name="Denoise method",
+            options={"SVD per window": "svd", "Calibrated spatial basis": "calibration", "Running spatial basis": "running"},
+            value=controller.denoise_method,
+        )
+        self.denoise_refit = pn.widgets.IntInput(name="Refit basis every N windows (0 = never)", value=controller.denoise_refit, step=1, start=0, end=10000)
 
         self.ts_widget = TimeseriesView(controller, self.ncols, self.nrows)
         # ---------------------------
@@ -136,7 +183,9 @@ class EventViewPanel(pn.viewable.Viewer):
                 pn.pane.Markdown("**Bandpass filter parameters**"),
                 pn.Row(self.lowcut_spin, self.highcut_spin),
                 pn.Row(pn.Spacer(width=100), self.order_spin, pn.Spacer(width=100)),
+                self.filter_backend,
                 self.denoise,
+                pn.Row(self.denoise_method, self.denoise_refit),
                 pn.Row(self.add_notch_btn, self.clear_notch_btn),
                 
                 self.notch_layout,
@@ -171,6 +220,8 @@ class EventViewPanel(pn.viewable.Viewer):
             pn.Column(
                 pn.Row(pn.pane.Markdown("Probe:"), self.ch_col_spin, self.ch_row_spin),
                 pn.Row(pn.pane.Markdown("Display:"), self.dis_col_spin, self.dis_row_spin),
+                self.precision_select,
+                self.display_mode,
                 self.load_button,
             ),
             title="Probe",
@@ -183,7 +234,8 @@ class EventViewPanel(pn.viewable.Viewer):
 
 
         acquisition_folder = pn.Card(
-            pn.Column(self.select_folder_btn, self.path_display,self.folder_display),
+            pn.Column(self.select_folder_btn, self.path_display,self.folder_display, self.spinner_memory, self.spinner_workers,
+                      self.recompute_backend),
             title="Acquisition folder",
             sizing_mode="stretch_width",
             margin=(20, 0, 20, 0),  # (top, right, bottom, left)
@@ -203,7 +255,7 @@ class EventViewPanel(pn.viewable.Viewer):
 
         self.plot_area = pn.Row(pn.widgets.StaticText(name="", value="No probe view loaded."), sizing_mode="stretch_both",height_policy='max')
 
-        event_display_control = pn.Column(pn.Row(self.dropdown, self.spinner_duration, self.PSD), self.plot_area)
+        event_display_control = pn.Column(pn.Row(self.dropdown, self.spinner_duration, self.PSD, self.psd_log_bins, self.SEM), self.plot_area)
 
         self.layout = pn.template.FastListTemplate(
                     sidebar=[config_panel, self.probe_panel, acquisition_folder, self.ts_widget], # 
@@ -223,12 +275,20 @@ class EventViewPanel(pn.viewable.Viewer):
         cfg = {}
         cfg["save path"] = getattr(self.controller, "selected_folder", "")
         cfg["nbr event to record"] = self.spinner_nbr_events.value
+        cfg["event memory budget"] = self.spinner_memory.value
+        cfg["filter workers"] = self.spinner_workers.value
+        cfg["recompute backend"] = self.recompute_backend.value
         cfg["event duration"] = self.spinner_duration.value
+        cfg["psd log bins"] = self.psd_log_bins.value
         cfg["filter setting"] = {
             "low frequency band": self.lowcut_spin.value,
             "high frequency band": self.highcut_spin.value,
             "order": self.order_spin.value,
             "notch filter": [{"frequency": w[0].value, "harmonic": w[1].value} for w in self.notch_widgets],
+            "denoise": bool(self.denoise.value),
+            "denoise method": self.denoise_method.value,
+            "denoise refit": self.denoise_refit.value,
+            "filter backend": self.filter_backend.value,
         }
         if getattr(self.controller, "model", None) is not None:
             m = self.controller.model
@@ -237,6 +297,8 @@ class EventViewPanel(pn.viewable.Viewer):
                 "probe row": m.nbr_row if hasattr(m, "nbr_row") else self.nrows,
                 "display divider column": m.col_divider if hasattr(m, "col_divider") else self.col_divider,
                 "display divider row": m.row_divider if hasattr(m, "row_divider") else self.row_divider,
+                "compute precision": str(m.precision) if hasattr(m, "precision") else self.precision_select.value,
+                "display mode": self.display_mode.value,
             }
         cfg["event trigger setting"] = [cb.value for cb in self.event_checkboxes]
         # special events
@@ -270,8 +332,16 @@ class EventViewPanel(pn.viewable.Viewer):
             self.path_display.value = config['save path']
         if "nbr event to record" in config:
             self.spinner_nbr_events.value = config["nbr event to record"]
+        if "event memory budget" in config:
+            self.spinner_memory.value = config["event memory budget"]
+        if "filter workers" in config:
+            self.spinner_workers.value = config["filter workers"]
+        if "recompute backend" in config:
+            self.recompute_backend.value = config["recompute backend"]
         if "event duration" in config:
             self.spinner_duration.value = config["event duration"]
+        if "psd log bins" in config:
+            self.psd_log_bins.value = config["psd log bins"]
         if "probe setting" in config:
             ps = config["probe setting"]
             # try to set widgets (guard for missing keys)
@@ -279,11 +349,17 @@ class EventViewPanel(pn.viewable.Viewer):
             self.ch_row_spin.value = ps.get("probe row", self.ch_row_spin.value)
             self.dis_col_spin.value = ps.get("display divider column", self.dis_col_spin.value)
             self.dis_row_spin.value = ps.get("display divider row", self.dis_row_spin.value)
+            self.precision_select.value = ps.get("compute precision", self.precision_select.value)
+            self.display_mode.value = ps.get("display mode", self.display_mode.value)
         if "filter setting" in config:
             fs = config["filter setting"]
             self.lowcut_spin.value = fs.get("low frequency band", self.lowcut_spin.value)
             self.highcut_spin.value = fs.get("high frequency band", self.highcut_spin.value)
             self.order_spin.value = fs.get("order", self.order_spin.value)
+            self.denoise.value = fs.get("denoise", self.denoise.value)
+            self.denoise_method.value = fs.get("denoise method", self.denoise_method.value)
+            self.denoise_refit.value = fs.get("denoise refit", self.denoise_refit.value)
+            self.filter_backend.value = fs.get("filter backend", self.filter_backend.value)
             # notches
             if "notch filter" in fs:
                 self._clear_notch_filters()
@@ -315,7 +391,8 @@ class EventViewPanel(pn.viewable.Viewer):
 
     def _apply_filters(self, event=None):
         notch_filter = [(w[0].value, w[1].value) for w in self.notch_widgets]
-        self.controller.update_filter(self.lowcut_spin.value, self.highcut_spin.value, self.order_spin.value, notch_filter, bool(self.denoise.value))
+        self.controller.update_filter(self.lowcut_spin.value, self.highcut_spin.value, self.order_spin.value, notch_filter, bool(self.denoise.value),
+                                      self.denoise_method.value, self.denoise_refit.value, self.filter_backend.value)
         self.ts_widget.update()
     # ---------------------------
     # Probe / View helpers
@@ -324,6 +401,9 @@ class EventViewPanel(pn.viewable.Viewer):
     def _update_psd(self, event=None):
         self.controller.update_psd(self.PSD.value)
 
+    def _on_psd_log_bins_change(self, event):
+        self.controller.update_psd_log_bins(event.new)
+
     def _on_ch_col_change(self, event):
         self.ncols = event.new
         self.ts_widget.update_grid(self.ncols, self.nrows)
@@ -337,6 +417,10 @@ class EventViewPanel(pn.viewable.Viewer):
 
     def _on_dis_row_change(self, event):
         self.row_divider = event.new
+
+    def _on_precision_change(self, event):
+        # applied on next "Load probe view"
+        self.controller.precision = event.new
         
 
     def _checkbox_callback(self, event, idx):
@@ -426,6 +510,15 @@ class EventViewPanel(pn.viewable.Viewer):
     def _on_nbr_events_change(self, event):
         self.controller.update_nbr_events(event.new)
 
+    def _on_memory_budget_change(self, event):
+        self.controller.update_event_memory_budget(event.new)
+
+    def _on_filter_workers_change(self, event):
+        self.controller.update_filter_workers(event.new)
+
+    def _on_recompute_backend_change(self, event):
+        self.controller.update_recompute_backend(event.new)
+
     def _on_event_type_change(self, event):
         self.controller.event_type = event.new
         self.update_sources()
@@ -435,82 +528,15 @@ class EventViewPanel(pn.viewable.Viewer):
         self.load_button.disabled = True
         self.start_btn.disabled = True
 
-        nbr_col_display = int(self.ncols / self.col_divider)
-        nbr_row_display = int(self.nrows / self.row_divider)
-        nplots = nbr_col_display * nbr_row_display
-
         x, y = self.controller.setup_event_view(self.ncols*self.nrows, self.ncols, self.nrows, self.col_divider, self.row_divider)
         
         self.select_folder_btn.disabled = False
-        # Pre-allocate empty curves
-        self.pipes = None
-        self.hv_plots = []
+        self.grid = None
         self.plot_area.clear()
 
         def create_plots():
             self.layout.busy_indicator.active = True
-            self.pipes = Pipe(data=(np.asarray(x),np.asarray(y)))
-
-            for i in range(nbr_col_display):
-                # start with zeros (or empty list)
-                curves = [hv.VLine(0).opts(line_color='black', line_width=1, line_dash='dashed',  tools=[], active_tools=[])]
-
-                for j in range(nbr_row_display):
-                    
-                    def get_curve(data, nbr_row_display=nbr_row_display, i=i, j=j):
-                            x, y = data
-                            curve =  hv.Curve((x, y[i*nbr_row_display + j, :]))
-                            if self.current_xlim != (None, None):
-                                curve = curve.redim.range(x=self.current_xlim)
-                            return curve
-
-                    dmap = hv.DynamicMap(get_curve, streams=[self.pipes]).opts(subcoordinate_y=True,
-                                                                        subcoordinate_scale=1,
-                                                                        min_width = 120,
-                                                                        min_height = 200,
-                                                                        yaxis=None,   
-                                                                        show_grid=True,
-                                                                        show_legend=False,
-                                                                        responsive=True,
-                                                                        tools=[], active_tools=[],
-                                                                        toolbar=None,
-                                                                        xrotation=45,
-                                                                        fontsize={'xticks': 8, 'xlabel': 10},
-                                                                        xticks=5
-                                                                        
-                                                                    )
-                    
-                    if self.col_divider == 1: 
-                        label =  f"C {j*self.row_divider+1}"
-                    else : 
-                        label =  f"C {j*self.row_divider+1}-{(j+1)*self.row_divider}"
-                    
-                    dmap = dmap.relabel(f"R {j*self.row_divider+1}-{(j+1)*self.row_divider}")
-                    
-                    if i == 0: 
-                        dmap.opts(yaxis='left', min_width = 220) 
-                        
-                    if self.col_divider == 1: 
-                        label =  f"C {i*self.col_divider+1}"
-                    else : 
-                        label =  f"C {i*self.col_divider+1}-{(i+1)*self.col_divider}"
-
-                    dmap.opts(xlabel = label, 
-                              axiswise=False, framewise=True,
-                              tools=[], active_tools=[]
-                              
-                              )
-
-                    curves.append(dmap)
-                    
-
-                overlay = hv.Overlay(curves).collate()
-                overlay.opts(tools=['xwheel_zoom','ywheel_zoom', 'xpan'], active_tools=['ywheel_zoom'])
-             
-                self.hv_plots.append(overlay)
-                
-
-            self.plot_area.extend(self.hv_plots)
+            self._build_renderer(x, y)
             self.load_button.name = "Load probe view"
             self.load_button.disabled = False
 
@@ -521,19 +547,69 @@ class EventViewPanel(pn.viewable.Viewer):
         thread.start()
 
 
-    def update_sources(self, *args, **kwargs):
-        """Called by controller when new data is available (or by user)."""
-        try: 
-            x, y = self.controller.get_data_event(psd = bool(self.PSD.value))
-            x = np.asarray(x)
+    def _build_renderer(self, x=None, y=None):
+        """(Re)create the event grid renderer for the current display mode."""
+        # the loaded model fixes the layout, whatever the spinners say since
+        m = self.controller.model
+        nbr_col_display = int(m.nbr_col / m.col_divider)
+        nbr_row_display = int(m.nbr_row / m.row_divider)
+        if self.display_mode.value == "heatmap":
+            grid = HeatmapRenderer(nbr_col_display, nbr_row_display, m.col_divider, m.row_divider)
+        else:
+            grid = GridRenderer(nbr_col_display, nbr_row_display, m.col_divider, m.row_divider)
+        if x is not None:
+            grid.update(x, y)
 
-            if len(self.plot_area) >1:
-                if self.PSD.value:
-                    self.current_xlim=(0, 200)
-                else:
-                    self.current_xlim=(None, None)  # Auto xlim 
+        self.grid = grid
+        self.plot_area.clear()
+        self.plot_area.extend(grid.panes)
+
+    def _on_display_mode_change(self, event):
+        if self.grid is None:
+            return
+        self._build_renderer()
+        self.update_sources()
 
-                self.pipes.send((x, np.asarray(y)))   
+    def update_sources(self, *args, **kwargs):
+        """
+        Called by controller when new data is available (or by user).
+        The refresh runs as a job on the controller's executor, off the
+        Bokeh thread and after any queued settings change; a newer request
+        supersedes one still waiting, and at most one refresh runs per frame_interval.
+        """
+        self.controller.submit_latest("refresh", self._refresh_sources)
+
+    def _refresh_sources(self, cancelled):
+        delay = self._last_refresh + self.frame_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            if cancelled():
+                return
+        self._last_refresh = time.monotonic()
+
+        try: 
+            # the heatmap averages down to its own pixel grid
+            max_points = None if self.display_mode.value == "heatmap" else self.max_points
+            psd = bool(self.PSD.value)
+            self.current_xlim = (0, 200) if psd else (None, None)  # Auto xlim 
+
+            def show(x, y, band):
+                if self.grid is not None:
+                    self.grid.update(np.asarray(x), np.asarray(y), band, xlim=self.current_xlim)
+
+            def show_partial(x, y, band):
+                # group average of the members recomputed so far, one frame at most per frame_interval
+                if cancelled() or time.monotonic() - self._last_refresh < self.frame_interval:
+                    return
+                self._last_refresh = time.monotonic()
+                show(x, y, band)
+
+            x, y, band = self.controller.get_data_event(psd=psd, max_points=max_points, sem=bool(self.SEM.value),
+                                                        cancelled=cancelled, on_partial=show_partial)
+            if x is None or cancelled():
+                # superseded by newer settings, their refresh follows
+                return
+            show(x, y, band)
         except Exception as e: 
             print(e)
 
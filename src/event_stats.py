@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class RunningStats:
+    """
+    Running mean and variance of event snapshots (Welford's algorithm).
+
+    Each snapshot is folded in once, so the group average and its standard
+    error cost O(snapshot) per new event instead of re-stacking the group.
+    """
+
+    def __init__(self, version=None):
+        self.version = version   # snapshot settings the members were computed with
+        self.members = set()
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def add(self, ts, snapshot):
+        if ts in self.members:
+            return
+        snapshot = np.asarray(snapshot, dtype=np.float64)
+        if self.mean is None:
+            self.mean = np.zeros_like(snapshot)
+            self._m2 = np.zeros_like(snapshot)
+        elif snapshot.shape != self.mean.shape:
+            raise ValueError(f"Snapshot shape {snapshot.shape} does not match group shape {self.mean.shape}")
+
+        self.members.add(ts)
+        self.count += 1
+        delta = snapshot - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (snapshot - self.mean)
+
+    def variance(self):
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return self._m2 / (self.count - 1)
+
+    def sem(self):
+        """Standard error of the mean."""
+        return np.sqrt(self.variance() / self.count)
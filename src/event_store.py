@@ -0,0 +1,170 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class EventStore:
+    """
+    Dict-like store of event snapshots with a RAM budget.
+
+    The most recently written or read snapshots stay in memory. Once they
+    exceed `memory_budget` bytes, the least recently used ones are written
+    to a spill file in `spill_dir` (the session folder) and read back from
+    it as copies: a slot is reused once its snapshot is overwritten, so a
+    view handed out earlier would silently change to another event's data.
+    """
+
+    def __init__(self, memory_budget=512 * 2**20, spill_dir=None):
+        self.memory_budget = memory_budget   # bytes, None for unlimited
+        self.spill_dir = spill_dir
+        self._lock = threading.RLock()
+
+        self._hot = OrderedDict()            # ts -> array, least recently used first
+        self._hot_bytes = 0
+        self._spilled = {}                   # ts -> (offset, shape, dtype)
+        self._versions = {}                  # ts -> settings the snapshot was computed with
+        self._free_slots = {}                # nbytes -> [offsets] left by overwritten snapshots
+
+        self._path = None
+        self._file = None
+        self._size = 0
+        self._map = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._hot) + len(self._spilled)
+
+    def __contains__(self, ts):
+        with self._lock:
+            return ts in self._hot or ts in self._spilled
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(self._hot) + list(self._spilled)
+
+    def __getitem__(self, ts):
+        with self._lock:
+            if ts in self._hot:
+                self._hot.move_to_end(ts)
+                return self._hot[ts]
+            offset, shape, dtype = self._spilled[ts]
+            return np.array(self._view(offset, shape, dtype))
+
+    def __setitem__(self, ts, snapshot):
+        self.put(ts, snapshot)
+
+    def put(self, ts, snapshot, version=None):
+        """Store a snapshot along with the version key of the settings that produced it."""
+        snapshot = np.asarray(snapshot)
+        with self._lock:
+            self._discard(ts)
+            self._versions[ts] = version
+            self._hot[ts] = snapshot
+            self._hot_bytes += snapshot.nbytes
+            self._evict()
+
+    def __delitem__(self, ts):
+        with self._lock:
+            if ts not in self:
+                raise KeyError(ts)
+            self._discard(ts)
+            self._versions.pop(ts, None)
+
+    def version(self, ts):
+        return self._versions.get(ts)
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+            self._hot_bytes = 0
+            self._spilled.clear()
+            self._versions.clear()
+            self._free_slots.clear()
+            self._close_file()
+
+    def close(self):
+        self.clear()
+
+    @property
+    def memory_bytes(self):
+        return self._hot_bytes
+
+    # ----------------------------------------------------------------
+    # Internals (called with the lock held)
+    # ----------------------------------------------------------------
+    def _discard(self, ts):
+        if ts in self._hot:
+            self._hot_bytes -= self._hot.pop(ts).nbytes
+        elif ts in self._spilled:
+            offset, shape, dtype = self._spilled.pop(ts)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self._free_slots.setdefault(nbytes, []).append(offset)
+
+    def _evict(self):
+        if self.memory_budget is None:
+            return
+        while self._hot_bytes > self.memory_budget and len(self._hot) > 1:
+            ts, snapshot = self._hot.popitem(last=False)
+            self._hot_bytes -= snapshot.nbytes
+            try:
+                self._spill(ts, snapshot)
+            except OSError as e:
+                # Keep it in RAM rather than lose it
+                print("Event spill error:", e)
+                self._hot[ts] = snapshot
+                self._hot.move_to_end(ts, last=False)
+                self._hot_bytes += snapshot.nbytes
+                return
+
+    def _spill(self, ts, snapshot):
+        if self._file is None:
+            self._open_file()
+
+        data = np.ascontiguousarray(snapshot)
+        slots = self._free_slots.get(data.nbytes)
+        if slots:
+            offset = slots.pop()
+        else:
+            offset = self._size
+            self._size += data.nbytes
+
+        self._file.seek(offset)
+        self._file.write(data.tobytes())
+        self._file.flush()
+        self._spilled[ts] = (offset, data.shape, data.dtype)
+
+    def _view(self, offset, shape, dtype):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self._map is None or self._map.shape[0] < offset + nbytes:
+            self._map = np.memmap(self._path, dtype=np.uint8, mode="r", shape=(self._size,))
+        return self._map[offset:offset + nbytes].view(dtype).reshape(shape)
+
+    def _open_file(self):
+        folder = Path(self.spill_dir) if self.spill_dir is not None else None
+        if folder is None or not folder.is_dir():
+            folder = Path(tempfile.gettempdir())
+        fd, path = tempfile.mkstemp(prefix="event_snapshots_", suffix=".bin", dir=folder)
+        self._file = os.fdopen(fd, "w+b")
+        self._path = path
+        self._size = 0
+        print(f"Spilling event snapshots to {path}")
+
+    def _close_file(self):
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self._path)
+            except OSError:
+                # Still mapped by a view somewhere (Windows), leave it
+                pass
+        self._path = None
+        self._size = 0
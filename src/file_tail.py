@@ -0,0 +1,86 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def _inotify_watch(path):
+    """Return an inotify fd watching `path` for writes, or None if unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        wd = libc.inotify_add_watch(fd, os.fsencode(path), IN_MODIFY | IN_CLOSE_WRITE)
+        if wd < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class FileTail:
+    """
+    Follow a growing file through one persistent handle.
+
+    On Linux the reader sleeps on inotify and wakes as soon as the writer
+    flushes; elsewhere (or with use_inotify=False) it falls back to sleeping
+    `poll_interval` between reads. Reads return every complete block
+    available, partial blocks are kept until the rest is written.
+    """
+
+    def __init__(self, path, block_size, offset=0, poll_interval=0.1, idle_timeout=0.5, use_inotify=True):
+        self.path = path
+        self.block_size = block_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+        self._file = open(path, "rb", buffering=0)
+        self._file.seek(offset)
+        self._pending = b""
+        self._inotify_fd = _inotify_watch(path) if use_inotify else None
+
+    @property
+    def event_driven(self):
+        return self._inotify_fd is not None
+
+    def wait(self):
+        """Block until the file was written to (or until timeout)."""
+        if self._inotify_fd is None:
+            time.sleep(self.poll_interval)
+            return
+
+        ready, _, _ = select.select([self._inotify_fd], [], [], self.idle_timeout)
+        if ready:
+            try:
+                # Drain queued notifications, we only care that something happened
+                while os.read(self._inotify_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def read_available(self):
+        """Return all complete blocks written since the last call, as bytes."""
+        data = self._file.readall()
+        if self._pending:
+            data = self._pending + data
+        n_aligned = len(data) - len(data) % self.block_size
+        self._pending = data[n_aligned:]
+        return data[:n_aligned]
+
+    def close(self):
+        self._file.close()
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
@@ -0,0 +1,171 @@
+import math
+import threading
+import warnings
+from functools import partial
+
+import numpy as np
+import panel as pn
+from bokeh.models import ColumnDataSource, FixedTicker, Range1d, Span
+from bokeh.plotting import figure
+
+from bokeh_schedule import schedule
+
+
+class GridRenderer:
+    """
+    Event grid drawn with a handful of shared Bokeh glyphs.
+
+    Each display column is one figure holding a single MultiLine (one line
+    per display row) and a single Patches for the SEM band, fed by one
+    ColumnDataSource each. Every cell is scaled into its own unit-high lane,
+    stacked by row, so an update is one data swap per column whatever the
+    number of cells. Once a column has been sent, later updates on the same
+    time axis patch only the rows that changed. Traces travel as float32.
+    All figures share their x and y ranges.
+    """
+
+    def __init__(self, n_cols, n_rows, col_divider, row_divider, color="#30a2da"):
+        self.n_cols = n_cols
+        self.n_rows = n_rows
+        self.x_range = Range1d(0, 1)
+        self.y_range = Range1d(0, n_rows)
+        self._x_extent = None
+        self._sent = [None] * n_cols  # (x, row traces, row bands) last sent per column
+        self._lock = threading.Lock()
+
+        self.sources = []
+        self.band_sources = []
+        self.figures = []
+        for i in range(n_cols):
+            fig = figure(
+                x_range=self.x_range, y_range=self.y_range,
+                tools="xwheel_zoom,ywheel_zoom,xpan", active_scroll="ywheel_zoom",
+                toolbar_location=None, sizing_mode="stretch_both",
+                min_width=220 if i == 0 else 120, min_height=200,
+            )
+            source = ColumnDataSource(data=dict(xs=[[] for _ in range(n_rows)], ys=[[] for _ in range(n_rows)]))
+            band_source = ColumnDataSource(data=dict(xs=[], ys=[]))
+            fig.patches("xs", "ys", source=band_source, fill_color=color, fill_alpha=0.25, line_color=None)
+            fig.multi_line("xs", "ys", source=source, line_color=color, line_width=1.5)
+            fig.add_layout(Span(location=0, dimension="height", line_color="black", line_width=1, line_dash="dashed"))
+
+            if col_divider == 1:
+                fig.xaxis.axis_label = f"C {i*col_divider+1}"
+            else:
+                fig.xaxis.axis_label = f"C {i*col_divider+1}-{(i+1)*col_divider}"
+            fig.xaxis.ticker.desired_num_ticks = 5
+            fig.xaxis.major_label_orientation = math.pi / 4
+            fig.xaxis.major_label_text_font_size = "8pt"
+            fig.xaxis.axis_label_text_font_size = "10pt"
+
+            if i == 0:
+                fig.yaxis.ticker = FixedTicker(ticks=[j + 0.5 for j in range(n_rows)])
+                fig.yaxis.major_label_overrides = {
+                    j + 0.5: f"R {j*row_divider+1}-{(j+1)*row_divider}" for j in range(n_rows)
+                }
+                fig.yaxis.major_label_text_font_size = "8pt"
+            else:
+                fig.yaxis.visible = False
+            fig.ygrid.ticker = FixedTicker(ticks=list(range(n_rows + 1)))
+
+            self.sources.append(source)
+            self.band_sources.append(band_source)
+            self.figures.append(fig)
+
+        self.panes = [pn.pane.Bokeh(fig, sizing_mode="stretch_both") for fig in self.figures]
+
+    def update(self, x, y, band=None, xlim=(None, None)):
+        """
+        Draw (cells, samples) traces y over x. Cells are in Model.reduce_cells
+        order (row-major); band is an optional (lower, upper) pair shaped like y.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(self.n_rows, self.n_cols, -1)
+        if band is not None:
+            band = tuple(np.asarray(b, dtype=np.float64).reshape(y.shape) for b in band)
+
+        # Scale each cell into [row, row + 1], the band on the same scale as its mean
+        stacked = y if band is None else np.concatenate((y,) + band, axis=-1)
+        stacked = np.where(np.isfinite(stacked), stacked, np.nan)
+        lo = np.zeros(y.shape[:2] + (1,))
+        hi = np.ones(y.shape[:2] + (1,))
+        if stacked.shape[-1]:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN cells
+                lo = np.nan_to_num(np.nanmin(stacked, axis=-1, keepdims=True))
+                hi = np.nan_to_num(np.nanmax(stacked, axis=-1, keepdims=True))
+        span = np.where(hi > lo, hi - lo, 1.0)
+        lanes = np.arange(self.n_rows, dtype=np.float64)[:, None, None]
+
+        def to_lane(values):
+            return (lanes + 0.05 + 0.9 * (values - lo) / span).astype(np.float32)
+
+        y_lane = to_lane(y)
+        band_lane = None if band is None else tuple(to_lane(b) for b in band)
+        x32 = x.astype(np.float32)
+        outline_x = np.concatenate((x32, x32[::-1]))
+
+        columns = []
+        with self._lock:
+            for i in range(self.n_cols):
+                ys = [y_lane[j, i] for j in range(self.n_rows)]
+                band_ys = None if band_lane is None else [
+                    np.concatenate((band_lane[0][j, i], band_lane[1][j, i, ::-1])) for j in range(self.n_rows)
+                ]
+                columns.append(self._column_update(i, x32, outline_x, ys, band_ys))
+
+        if xlim != (None, None):
+            extent = xlim
+        elif len(x):
+            extent = (float(x[0]), float(x[-1]))
+        else:
+            extent = self._x_extent
+
+        schedule(self.figures[0] if self.figures else None, partial(self._apply, columns, extent))
+
+    def _column_update(self, i, x, outline_x, ys, band_ys):
+        """
+        What to send for column i: ("data", lines, patches) to replace both
+        sources, ("patch", lines, patches) with only the rows that differ
+        from what was last sent, or None if nothing changed.
+        """
+        previous = self._sent[i]
+        self._sent[i] = (x, ys, band_ys)
+
+        if (previous is None or not np.array_equal(previous[0], x)
+                or (previous[2] is None) != (band_ys is None)):
+            lines = dict(xs=[x] * self.n_rows, ys=ys)
+            if band_ys is None:
+                patches = dict(xs=[], ys=[])
+            else:
+                patches = dict(xs=[outline_x] * self.n_rows, ys=band_ys)
+            return ("data", lines, patches)
+
+        rows = [j for j in range(self.n_rows) if not np.array_equal(previous[1][j], ys[j])]
+        band_rows = [] if band_ys is None else [
+            j for j in range(self.n_rows) if not np.array_equal(previous[2][j], band_ys[j])
+        ]
+        if not rows and not band_rows:
+            return None
+        return ("patch",
+                dict(ys=[(j, ys[j]) for j in rows]) if rows else None,
+                dict(ys=[(j, band_ys[j]) for j in band_rows]) if band_rows else None)
+
+    def _apply(self, columns, extent):
+        for source, band_source, update in zip(self.sources, self.band_sources, columns):
+            if update is None:
+                continue
+            kind, lines, patches = update
+            if kind == "data":
+                source.data = lines
+                band_source.data = patches
+            else:
+                # only the cells that changed cross the websocket
+                if lines:
+                    source.patch(lines)
+                if patches:
+                    band_source.patch(patches)
+        # Only reset the zoom when the data extent itself changed
+        if extent is not None and extent != self._x_extent:
+            self._x_extent = extent
+            self.x_range.start, self.x_range.end = extent
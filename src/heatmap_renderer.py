@@ -0,0 +1,128 @@
+from functools import partial
+
+import numpy as np
+import panel as pn
+from bokeh.models import ColorBar, ColumnDataSource, FixedTicker, HoverTool, LinearColorMapper, Range1d, Span
+from bokeh.palettes import RdBu11, Viridis256
+from bokeh.plotting import figure
+
+from bokeh_schedule import schedule
+
+
+def bin_mean(x, y, edges, axis=-1):
+    """
+    Mean of y over the bins of sorted coordinates x delimited by `edges`.
+    Bins holding no sample are NaN, so irregular axes (log-binned PSDs)
+    show gaps rather than stretched values.
+    """
+    y = np.moveaxis(np.asarray(y, dtype=np.float64), axis, -1)
+    starts = np.searchsorted(x, edges[:-1], side="left")
+    stops = np.searchsorted(x, edges[1:], side="left")
+    stops[-1] = np.searchsorted(x, edges[-1], side="right")
+
+    # Running sums of finite values and of their count, so a -inf dB bin only blanks itself
+    valid = np.isfinite(y)
+    pad = np.zeros(y.shape[:-1] + (1,))
+    sums = np.concatenate((pad, np.cumsum(np.where(valid, y, 0), axis=-1)), axis=-1)
+    counts = np.concatenate((pad, np.cumsum(valid, axis=-1)), axis=-1)
+    n = counts[..., stops] - counts[..., starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(n > 0, (sums[..., stops] - sums[..., starts]) / n, np.nan)
+    return np.moveaxis(out, -1, axis)
+
+
+class HeatmapRenderer:
+    """
+    Event grid drawn as one image: display cells along y (row-major, as
+    Model.reduce_cells orders them) and time along x.
+
+    The server averages the snapshot down to the image's pixel grid
+    (`width_px` time bins, `height_px` cell bins) before sending it, so
+    every electrode can be shown at once and the rendering cost does not
+    depend on the number of cells. Signed data gets a diverging colour
+    scale centred on zero.
+    """
+
+    def __init__(self, n_cols, n_rows, col_divider, row_divider, width_px=800, height_px=768):
+        self.n_cols = n_cols
+        self.n_rows = n_rows
+        self.n_cells = n_cols * n_rows
+        self.width_px = width_px
+        self.height_px = height_px
+        self._x_extent = None
+        self._sent = None
+
+        self.x_range = Range1d(0, 1)
+        self.y_range = Range1d(0, self.n_cells)
+        self.color_mapper = LinearColorMapper(palette=list(RdBu11[::-1]), nan_color="rgba(0, 0, 0, 0)")
+        self.source = ColumnDataSource(data=dict(image=[], x=[], y=[], dw=[], dh=[]))
+
+        self.figure = figure(
+            x_range=self.x_range, y_range=self.y_range,
+            tools="xwheel_zoom,ywheel_zoom,xpan,reset", active_scroll="ywheel_zoom",
+            sizing_mode="stretch_width", frame_height=height_px, min_width=400,
+        )
+        image = self.figure.image("image", x="x", y="y", dw="dw", dh="dh", source=self.source,
+                                  color_mapper=self.color_mapper)
+        self.figure.add_tools(HoverTool(renderers=[image], tooltips=[("x", "$x{0.0}"), ("cell", "$y{0}"), ("value", "@image")]))
+        self.figure.add_layout(ColorBar(color_mapper=self.color_mapper, width=12), "right")
+        self.figure.add_layout(Span(location=0, dimension="height", line_color="black", line_width=1, line_dash="dashed"))
+
+        # One tick per probe row band, gridlines between bands
+        self.figure.yaxis.ticker = FixedTicker(ticks=[(j + 0.5) * n_cols for j in range(n_rows)])
+        self.figure.yaxis.major_label_overrides = {
+            (j + 0.5) * n_cols: f"R {j*row_divider+1}-{(j+1)*row_divider}" for j in range(n_rows)
+        }
+        self.figure.yaxis.major_label_text_font_size = "8pt"
+        self.figure.ygrid.ticker = FixedTicker(ticks=[j * n_cols for j in range(n_rows + 1)])
+        self.figure.ygrid.grid_line_color = "black"
+        self.figure.ygrid.grid_line_alpha = 0.3
+        self.figure.xgrid.visible = False
+
+        self.panes = [pn.pane.Bokeh(self.figure, sizing_mode="stretch_width")]
+
+    def update(self, x, y, band=None, xlim=(None, None)):
+        """Show (cells, samples) y over x; band is ignored, a raster has no room for it."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(self.n_cells, -1)
+        if xlim != (None, None):
+            keep = (x >= xlim[0]) & (x <= xlim[1])
+            x, y = x[keep], y[:, keep]
+        if len(x) == 0:
+            return
+
+        # Aggregate to the pixel grid: time bins along x, cell bins along y
+        # (each sample and cell covers a unit around its centre, so no bin falls between two)
+        step = (x[-1] - x[0]) / (len(x) - 1) if len(x) > 1 else 1.0
+        n_x = min(len(x), self.width_px)
+        x_edges = np.linspace(x[0] - step / 2, x[-1] + step / 2, n_x + 1)
+        image = bin_mean(x, y, x_edges, axis=-1)
+        n_y = min(self.n_cells, self.height_px)
+        cells = np.arange(self.n_cells) + 0.5
+        image = bin_mean(cells, image, np.linspace(0, self.n_cells, n_y + 1), axis=0)
+        image = image.astype(np.float32)
+
+        if self._sent is not None and self._sent.shape == image.shape and np.array_equal(self._sent, image, equal_nan=True):
+            return
+        self._sent = image
+
+        finite = image[np.isfinite(image)]
+        low, high = (np.percentile(finite, [1, 99]) if finite.size else (0.0, 1.0))
+        if low < 0 < high:
+            bound = max(-low, high)
+            low, high, palette = -bound, bound, list(RdBu11[::-1])
+        else:
+            palette = Viridis256
+        if high <= low:
+            high = low + 1
+
+        data = dict(image=[image], x=[x_edges[0]], y=[0], dw=[x_edges[-1] - x_edges[0]], dh=[self.n_cells])
+        extent = xlim if xlim != (None, None) else (float(x[0]), float(x[-1]))
+        schedule(self.figure, partial(self._apply, data, float(low), float(high), palette, extent))
+
+    def _apply(self, data, low, high, palette, extent):
+        self.source.data = data
+        self.color_mapper.update(low=low, high=high, palette=palette)
+        if extent != self._x_extent:
+            self._x_extent = extent
+            self.x_range.start, self.x_range.end = extent
@@ -0,0 +1,14 @@
+import threading
+
+
+class LockPickling:
+    """Pickle support for objects guarding their state with `self._lock`: the copy gets a new lock."""
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -5,13 +5,39 @@ import threading
 from scipy.signal import butter, sosfiltfilt, tf2sos, iirnotch, detrend,  welch, windows
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 from sklearn.decomposition import TruncatedSVD
 
+from ring_buffer import RingBuffer
+from continuous_file import ContinuousFile
+from file_tail import FileTail
+from streaming_filter import StreamingFilter
+from streaming_psd import StreamingWelch
+from event_store import EventStore
+from denoise import SpatialDenoiser
+from fft_filter import FFTFilter
+
 class Model:
-    def __init__(self, num_channel, nbr_col, nbr_row, col_divider, row_divider, max_buffer_seconds=2):
+    # Settings process_snapshot needs, the only state shipped to worker processes
+    _processing_state = (
+        "fs", "precision", "num_channel", "nbr_col", "nbr_row",
+        "col_divider", "row_divider", "sos_all", "denoise", "snapshot_len",
+        "denoise_engine", "filter_backend", "_fft_filter",
+    )
+
+    def __init__(self, num_channel, nbr_col, nbr_row, col_divider, row_divider, max_buffer_seconds=2, precision="float64"):
         self.fs = 1953.12  # Hz
-        self.data_event = {}
+        # Working precision for filtering, denoise and snapshots ("float32" halves memory traffic)
+        self.precision = np.dtype(precision)
+        # Event snapshots, kept in RAM up to the budget then spilled to the session folder
+        self.data_event = EventStore()
+        # Welch PSD of each snapshot, keyed on the version of the snapshot it was computed from
+        self.data_psd = EventStore()
+        self.psd_nperseg = 256
+        # Bytes of snapshots + PSDs kept in RAM (None for unlimited), split between the two stores
+        self.event_memory_budget = 512 * 2**20
+        self.snapshot_len = None
 
         self.num_channel = num_channel
         self.nbr_col = nbr_col
@@ -21,39 +47,72 @@ class Model:
 
         self.data_path = None
         self.file = None
+        self._reader = None
 
         # --- Rolling buffer settings
         self.max_buffer_seconds = max_buffer_seconds
         self.max_buffer_samples = int(max_buffer_seconds * self.fs)
-        self._buffer_start_sample = 0  # absolute sample index of first in buffer
         self._offset = 0               # bytes read so far
         # Preallocate rolling buffer
-        self.data = np.zeros((0, nbr_row, nbr_col), dtype=np.int16)
+        self.data = RingBuffer(self.max_buffer_samples, (nbr_row, nbr_col), dtype=np.int16)
         self._lock = threading.Lock()  # protect shared data
 
         # --- Stream control
         self._stop_event = threading.Event()
         self._reader_thread = None
+        self.ingest_mode = "tail"      # "tail": persistent handle woken by inotify, "poll": stat + reopen
 
         # --- Filters
         self.sos_all = None
         self.denoise = False
-
+        self._filter_settings = None
+        self._filter_key = None
+        self.event_duration = None
+        # Zero-phase backend: "sos" runs sosfiltfilt, "fft" applies |H|^2 in the frequency domain
+        self.filter_backend = "sos"
+        self._fft_filter = None
+        # Snapshots and the live view shard channels across this many threads (1 = serial)
+        self.filter_workers = os.cpu_count() or 1
+        self._filter_pool = None
+        self._filter_pool_size = 0
+        self._filter_pool_lock = threading.Lock()
+        # Raw + filtered bytes of the event windows processed together by compute_events
+        self.gather_budget = 64 * 2**20
+        # Denoise: "svd" fits SVDs on every window, "projection" reuses a learned spatial basis.
+        # Snapshots project on the basis of their epoch of the recording, learned on the
+        # calibration_seconds that open it; the live view keeps its own, following the stream.
+        self.denoise_engine = "svd"
+        self.denoiser = SpatialDenoiser(n_components=5)
+        self.live_denoiser = SpatialDenoiser(n_components=5)
+        self.calibration_seconds = 1.0
+        # Live view: "causal" filters only new samples, "zero_phase" refilters the whole buffer
+        self.live_filter_mode = "causal"
+        self.live_filter = None
+        self._live_channels = None
+        self._live_lock = threading.Lock()
+        # Live PSD: Welch segments of the raw stream, transformed once as they complete
+        self.live_psd = None
+        self._live_psd_channels = None
+
+
+    def __getstate__(self):
+        # Buffers, files, locks and threads stay in the acquisition process
+        return {k: self.__dict__[k] for k in self._processing_state if k in self.__dict__}
 
     def start_stream(self, poll_interval=0.1):
 
-        self._buffer_start_sample = 0  # absolute sample index of first in buffer
         self._offset = 0               # bytes read so far
-        # Preallocate rolling buffer
-        self.data = np.zeros((0, self.data.shape[1], self.data.shape[2]), dtype=np.int16)
+        with self._lock:
+            self.data.reset()
         if self.data_path is None:
             raise RuntimeError("data_path not set")
         if self.file is None:
             self.file = next(self.data_path.rglob("continuous.*"))
 
         self._stop_event.clear()
+        target = self._tail_file if self.ingest_mode == "tail" else self._watch_file
         self._reader_thread = threading.Thread(
-            target=self._watch_file, args=(poll_interval,), daemon=True
+            target=target, args=(poll_interval,), daemon=True
         )
         self._reader_thread.start()
         print("start reader")
@@ -85,14 +144,8 @@ class Model:
                     reshaped = samples.reshape(-1, self.nbr_row, self.nbr_col)
 
                     with self._lock:
-                        # append new data, drop oldest if needed
-                        self.data = np.concatenate((self.data, reshaped), axis=0)
-                        if self.data.shape[0] > self.max_buffer_samples:
-                            excess = self.data.shape[0] - self.max_buffer_samples
-                            self.data = self.data[excess:,:,:]
-                            print(self.data.shape)
-                            self._buffer_start_sample += excess
-                            print(self._buffer_start_sample)
+                        # overwrite oldest samples in place
+                        self.data.append(reshaped)
                         self._offset += n_new * bytes_per_sample
 
             except Exception as e:
@@ -100,6 +153,31 @@ class Model:
 
             time.sleep(poll_interval)
 
+    def _tail_file(self, poll_interval):
+        dtype = np.int16
+        bytes_per_sample = np.dtype(dtype).itemsize * self.num_channel
+
+        tail = FileTail(self.file, bytes_per_sample, offset=self._offset, poll_interval=poll_interval)
+        print("event driven reader" if tail.event_driven else "polling reader")
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    raw = tail.read_available()
+                    if raw:
+                        reshaped = np.frombuffer(raw, dtype=dtype).reshape(-1, self.nbr_row, self.nbr_col)
+                        with self._lock:
+                            # overwrite oldest samples in place
+                            self.data.append(reshaped)
+                            self._offset += len(raw)
+                        continue  # more may have been written while copying
+
+                except Exception as e:
+                    print("Stream read error:", e)
+
+                tail.wait()
+        finally:
+            tail.close()
+
     # ----------------------------------------------------------------
     # Helper to get any slice of data (from buffer or disk)
     # ----------------------------------------------------------------
@@ -107,99 +185,202 @@ class Model:
         """
         Return data between sample indices [start_sample, stop_sample).
         Waits if file not yet fully written, uses buffer if possible.
+        Slices read from disk are read-only views into the memory-mapped file.
         """
         dtype = np.int16
-        bytes_per_sample = np.dtype(dtype).itemsize * self.num_channel
         n_samples = stop_sample - start_sample
+        reader = self.get_reader()
 
-        # --- Wait until file has enough bytes ---
+        # --- Wait until file has enough samples ---
         if wait:
-            expected_bytes = stop_sample * bytes_per_sample
-            start_time = time.time()
-            timeout = 100  # seconds
-            while True:
-                file_size = os.path.getsize(self.file)
-                if file_size >= expected_bytes:
-                    break
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(
-                        f"Timeout: waited {timeout/60:.1f} minutes for file '{self.file}' "
-                        f"to reach {expected_bytes} bytes (currently {file_size} bytes)."
-                    )
-                time.sleep(0.05)
+            self._wait_for_samples(reader, stop_sample)
 
         # --- Try reading from buffer ---
         with self._lock:
-            if self.data is not None:
-                buf_start = self._buffer_start_sample
-                buf_end = buf_start + self.data.shape[0]
-
-                # Fully inside buffer
-                if start_sample >= buf_start and stop_sample <= buf_end:
-                    rel_start = start_sample - buf_start
-                    rel_stop = stop_sample - buf_start
-                    return self.data[rel_start:rel_stop, :, :].copy()
+            # Fully inside buffer
+            if self.data.contains(start_sample, stop_sample):
+                return self.data.read(start_sample, stop_sample)
 
         # --- If not in buffer, read from file ---
-        offset_bytes = start_sample * bytes_per_sample
-        file_size = os.path.getsize(self.file)
-        available_bytes = max(0, file_size - offset_bytes)
-        to_read_bytes = min(n_samples * bytes_per_sample, available_bytes)
-
-        if to_read_bytes <= 0:
-            # Requested slice is not yet written
-            return np.zeros((n_samples, self.nbr_row, self.nbr_col), dtype=dtype)
-
-        with open(self.file, "rb") as f:
-            f.seek(offset_bytes)
-            raw = np.frombuffer(f.read(to_read_bytes), dtype=dtype)
-
-        actual_samples = len(raw) // self.num_channel
-        reshaped = raw[:actual_samples*self.num_channel].reshape((actual_samples, self.nbr_row, self.nbr_col))
+        signal = reader.view(start_sample, stop_sample)
+        actual_samples = signal.shape[0]
 
         # Pad with zeros if slice incomplete
         if actual_samples < n_samples:
-            pad_shape = (n_samples - actual_samples, self.nbr_row, self.nbr_col)
-            reshaped = np.concatenate([reshaped, np.zeros(pad_shape, dtype=dtype)], axis=0)
-
-        return reshaped.copy()
-
-
-    def get_full_signal(self, psd=False):
+            padded = np.zeros((n_samples, self.nbr_row, self.nbr_col), dtype=dtype)
+            padded[:actual_samples] = signal
+            return padded
+
+        return signal
+
+    def _wait_for_samples(self, reader, stop_sample, timeout=100):
+        """Block until the file holds `stop_sample` samples, or raise TimeoutError after `timeout` seconds."""
+        if reader.mapped_samples >= stop_sample:
+            return
+        start_time = time.time()
+        while True:
+            available = reader.available_samples()
+            if available >= stop_sample:
+                return
+            if time.time() - start_time > timeout:
+                raise TimeoutError(
+                    f"Timeout: waited {timeout/60:.1f} minutes for file '{self.file}' "
+                    f"to reach {stop_sample} samples (currently {available} samples)."
+                )
+            time.sleep(0.05)
+
+    def get_reader(self):
+        """Memory-mapped reader for the current recording file."""
+        if self._reader is None or self._reader.path != self.file:
+            self._reader = ContinuousFile(self.file, self.nbr_row, self.nbr_col)
+            # epoch bases were learned on the previous recording
+            self.denoiser.reset()
+        return self._reader
+
+    def get_full_signal(self, psd=False, channels=None):
         """
         Return the full signal for a given electrode position (nrow, ncol).
+
+        Parameters
+        ----------
+        channels : list of (row, col), optional
+            Only these electrodes are sliced and filtered. Denoise needs every
+            electrode, so in that case all are filtered and the selection is
+            taken afterwards.
         
         Returns
         -------
         x : np.ndarray
             Time axis in seconds.
         y : np.ndarray
-            Signal values (filtered if filters set up).
+            Signal values (filtered if filters set up), shaped
+            (samples, rows, cols), or (samples, len(channels)) if channels is given.
         """
-        with self._lock:
-            data = self.data.copy()
-            start_sample = self._buffer_start_sample
+        denoise = not psd and self.denoise
+        selection = None if denoise else channels
+
+        if not psd and self.live_filter_mode == "causal" and self.sos_all is not None:
+            start_sample, signal = self._get_live_filtered(selection)
+        else:
+            with self._lock:
+                start_sample = self.data.start_sample
+                data = self._select_channels(self.data.segments(), selection)
+
+            signal = data.astype(self.precision)
+            if signal.shape[0] == 0: 
+                return np.array([]), signal
+            
+            if not psd and self.sos_all is not None:
+                try:
+                    signal = signal - np.mean(signal, axis=0)
+                    signal = self.zero_phase_filter(signal, axis=0, parallel=True)
+                except Exception as e:
+                    print(f"Filter full signal error: {e}")
 
-        # --- Extract one channel
-        signal = data.copy().astype(np.float64)
-        if signal.shape[0] == 0: 
+        if signal.shape[0] == 0:
             return np.array([]), signal
-        
-        if not psd and self.sos_all is not None:
-            try:
-                signal = signal - np.mean(signal, axis=0)
-                signal = sosfiltfilt(self.sos_all, signal, axis=0)
-            except Exception as e:
-                print(f"Filter full signal error: {e}")
 
-        if not psd and self.denoise: 
+        if denoise: 
             signal = self.apply_denoise(signal)
+            if channels is not None:
+                signal = self._select_channels([signal], channels)
 
         # --- Build time axis (seconds)
         n_samples = signal.shape[0]
         x = (np.arange(start_sample, start_sample + n_samples) / self.fs)
 
         return x, signal
+
+    def _select_channels(self, segments, channels):
+        """Concatenate buffer segments, keeping only the (row, col) channels if given."""
+        if channels is None:
+            parts = segments
+        else:
+            rows = [c[0] for c in channels]
+            cols = [c[1] for c in channels]
+            parts = [seg[:, rows, cols] for seg in segments]
+        if len(parts) == 1:
+            return np.array(parts[0])
+        return np.concatenate(parts, axis=0)
+
+    def get_live_signal(self, channels=None, since=None):
+        """
+        Causally filtered live view from absolute sample `since` onward.
+        Causal output never changes once computed, so callers can keep what
+        they already have; the whole filtered buffer is returned if since is
+        None or no longer buffered.
+
+        Returns
+        -------
+        start_sample : int
+        x : np.ndarray
+            Time axis in seconds.
+        y : np.ndarray
+            Shaped (samples, rows, cols), or (samples, len(channels)) if channels is given.
+        """
+        start_sample, signal = self._get_live_filtered(channels, since)
+        x = np.arange(start_sample, start_sample + signal.shape[0]) / self.fs
+        return start_sample, x, signal
+
+    def _get_live_filtered(self, channels=None, since=None):
+        """Causally filter samples ingested since the last call, return the filtered buffer (from `since` if buffered)."""
+        with self._live_lock:
+            key = None if channels is None else tuple(tuple(c) for c in channels)
+            if self.live_filter is None or self._live_channels != key:
+                shape = (self.nbr_row, self.nbr_col) if key is None else (len(key),)
+                self.live_filter = StreamingFilter(self.sos_all, self.max_buffer_samples, shape, dtype=self.precision)
+                self._live_channels = key
+                since = None  # samples the caller holds were filtered with other settings
+            live_filter = self.live_filter
+
+            with self._lock:
+                start = live_filter.end_sample
+                if not (self.data.start_sample <= start <= self.data.end_sample):
+                    start = self.data.start_sample
+                new = self._select_channels(self.data.segments(start, self.data.end_sample), key)
+
+            try:
+                live_filter.process(new, start)
+            except Exception as e:
+                print(f"Filter live signal error: {e}")
+                live_filter.reset(self.data.end_sample)
+
+            filtered = live_filter.filtered
+            start = filtered.start_sample
+            if since is not None and filtered.contains(since, filtered.end_sample):
+                start = since
+            return start, filtered.read(start, filtered.end_sample)
+
+    def get_live_psd(self, channels=None):
+        """
+        Welch PSD (dB) of the raw rolling buffer, updated with the samples
+        ingested since the last call.
+
+        Returns
+        -------
+        freqs : np.ndarray
+        psd_db : np.ndarray
+            Shaped (freqs, rows, cols), or (freqs, len(channels)) if channels is given.
+        """
+        with self._live_lock:
+            key = None if channels is None else tuple(tuple(c) for c in channels)
+            if self.live_psd is None or self._live_psd_channels != key:
+                shape = (self.nbr_row, self.nbr_col) if key is None else (len(key),)
+                self.live_psd = StreamingWelch(self.fs, self.max_buffer_samples, shape, dtype=self.precision)
+                self._live_psd_channels = key
+            live_psd = self.live_psd
+
+            with self._lock:
+                start = live_psd.end_sample
+                if not (self.data.start_sample <= start <= self.data.end_sample):
+                    start = self.data.start_sample
+                new = self._select_channels(self.data.segments(start, self.data.end_sample), key)
+
+            live_psd.process(new, start)
+            with np.errstate(divide="ignore"):
+                psd_db = 10 * np.log10(live_psd.psd())
+            return live_psd.freqs, np.moveaxis(psd_db, -1, 0)
+
     # ----------------------------------------------------------------
     # Analysis functions
     # ----------------------------------------------------------------
@@ -211,13 +392,75 @@ class Model:
                 if notch[0] * (i + 1) < self.fs / 2:
                     b, a = iirnotch(w0=notch[0] * (i + 1), Q=40, fs=self.fs)
                     sos_notches.append(tf2sos(b, a))
-        self.sos_all = np.vstack(sos_notches + [sos])
+        self.sos_all = np.vstack(sos_notches + [sos]).astype(self.precision)
         self.denoise = denoise
-
-    def compute_psd_with_hanning(self, signal, nperseg=256):
-
+        self._fft_filter = FFTFilter(self.sos_all, self.fs)
+        self._filter_settings = (lowcut, highcut, order, tuple(tuple(n) for n in notch_freq))
+        self._update_filter_key()
+        with self._live_lock:
+            self.live_filter = None
+
+    def configure_denoise(self, method, refit_every=0):
+        """method: "svd" (per window), or a reusable spatial basis: "calibration" / "running"."""
+        if method == "svd":
+            self.denoise_engine = "svd"
+        else:
+            self.denoise_engine = "projection"
+            for denoiser in (self.denoiser, self.live_denoiser):
+                denoiser.mode = method
+        for denoiser in (self.denoiser, self.live_denoiser):
+            denoiser.refit_every = refit_every
+        if self.sos_all is not None:
+            self._update_filter_key()
+
+    def _update_filter_key(self):
+        denoise_key = None
+        if self.denoise:
+            denoise_key = (self.denoise_engine,)
+            if self.denoise_engine == "projection":
+                denoise_key += (self.denoiser.mode, self.denoiser.refit_every, self.calibration_seconds)
+        filter_key = self._filter_settings + (self.denoise, denoise_key, self.filter_backend)
+        if filter_key != self._filter_key:
+            # the spatial bases were learned on differently filtered data, or another way
+            self.denoiser.reset()
+            self.live_denoiser.reset()
+        self._filter_key = filter_key
+
+    def snapshot_basis(self, event_ts):
+        """
+        Spatial basis the snapshot of `event_ts` is denoised with (None for the SVD engine).
+
+        The recording is cut in epochs of refit_every calibration windows
+        (one epoch for the whole recording when refit_every is 0 in
+        calibration mode); each epoch's basis is learned on the filtered
+        calibration window that opens it (running mode: on those of its last
+        denoiser.history epochs), so a snapshot is the same whatever other
+        events were computed before it, and costs a bounded number of window
+        fits after a settings change.
+        """
+        if not self.denoise or self.denoise_engine != "projection":
+            return None
+        window = max(1, int(self.calibration_seconds * self.fs))
+        every = self.denoiser.refit_every or (1 if self.denoiser.mode == "running" else 0)
+        epoch = int(event_ts) // (window * every) if every else 0
+
+        def read_window(k):
+            start = k * window * every
+            stop = start + window
+            reader = self.get_reader()
+            if self._reader_thread is None or not self._reader_thread.is_alive():
+                # finished recording: a last epoch may open on a shorter window
+                stop = min(stop, reader.available_samples())
+            signal = self.filter_signal(self.get_data_slice(start, stop), axis=0)
+            return signal.reshape(signal.shape[0], -1)
+
+        return self.denoiser.epoch_basis(epoch, read_window)
+
+    def compute_psd(self, signal, nperseg=256):
+        """Welch PSD (linear power) along the last axis, for any number of leading axes."""
+        nperseg = min(nperseg, signal.shape[-1])
         window = windows.hann(nperseg)
-        
+
         freqs, psd = welch(
             signal,
             fs=self.fs,
@@ -227,9 +470,39 @@ class Model:
             scaling='density',
             average='mean'
         )
+        return freqs, psd.astype(self.precision, copy=False)
 
+    def compute_psd_with_hanning(self, signal, nperseg=256):
+        freqs, psd = self.compute_psd(signal, nperseg)
         psd_db = 10 * np.log10(psd)
         return freqs, psd_db
+
+    def get_event_psds(self, event_ts):
+        """
+        PSD of the stored snapshots of `event_ts`, shaped (events, cells, freqs).
+        Cached PSDs are reused while their snapshot is unchanged; the others
+        are computed in one batched welch call.
+        """
+        event_ts = list(event_ts)
+        versions = [self.data_event.version(ts) for ts in event_ts]
+        missing = [i for i, (ts, version) in enumerate(zip(event_ts, versions))
+                   if ts not in self.data_psd or self.data_psd.version(ts) != version]
+
+        if missing:
+            snapshots = np.stack([self.data_event[event_ts[i]] for i in missing])
+            _, psds = self.compute_psd(snapshots, self.psd_nperseg)
+            for i, psd in zip(missing, psds):
+                self.data_psd.put(event_ts[i], psd, versions[i])
+
+        freqs = self.psd_freqs()
+        if not event_ts:
+            return freqs, np.zeros((0, 0, len(freqs)), dtype=self.precision)
+        return freqs, np.stack([self.data_psd[ts] for ts in event_ts])
+
+    def psd_freqs(self):
+        """Frequency axis of snapshot PSDs."""
+        nperseg = min(self.psd_nperseg, 2 * self.snapshot_len)
+        return np.fft.rfftfreq(nperseg, 1 / self.fs)
     
     def svd_denoise(self, data, n_components=20):
         if len(np.shape(data)) == 3:
@@ -246,62 +519,269 @@ class Model:
         return denoised
 
 
-    def apply_denoise(self, signal):
+    def apply_denoise(self, signal, basis=None):
+        """
+        Denoise a filtered (samples, rows, cols) window. With the projection
+        engine, `basis` (from snapshot_basis) is used if given, else the live
+        view's basis, which follows the stream.
+        """
         data_2d = signal.reshape(signal.shape[0], self.nbr_col*self.nbr_row)
+        if self.denoise_engine == "projection":
+            # reuse the learned spatial basis: one projection per window
+            if basis is None:
+                denoised_data = self.live_denoiser.denoise(data_2d)
+            else:
+                denoised_data = SpatialDenoiser.project(data_2d, basis)
+            return denoised_data.reshape(signal.shape[0], self.nbr_row, self.nbr_col)
+
         denoised_data = self.svd_denoise(data_2d, n_components=5)
         num_bands = 10
         bands, residual = np.array_split(denoised_data, num_bands), np.zeros_like(denoised_data) # tqwt decompose
         denoised_bands = [self.svd_denoise(band,n_components=3) for band in bands]
         reconstructed_signal = np.concatenate(denoised_bands) + residual # tqwt reconstruct
-        data_svd = reconstructed_signal.reshape(reconstructed_signal.shape[0], self.nbr_col,self.nbr_row)
+        data_svd = reconstructed_signal.reshape(reconstructed_signal.shape[0], self.nbr_row, self.nbr_col)
 
         return data_svd 
 
     def compute_event(self, event_ts, psd=False):
         """Compute event snapshot, loading from buffer or disk as needed."""
+        version = self.snapshot_version(psd)
+        signal = self.get_event_slice(event_ts)
+        basis = None if psd else self.snapshot_basis(event_ts)
+        meaned = self.process_snapshot(signal, psd, parallel=True, basis=basis)
+        self.data_event.put(event_ts, meaned, version)
+
+        return meaned
+
+    def snapshot_version(self, psd=False):
+        """Key of every setting a snapshot depends on."""
+        return (self._filter_key, self.event_duration, bool(psd))
+
+    def is_fresh(self, event_ts, psd=False):
+        """True if the stored snapshot was computed with the current settings."""
+        return event_ts in self.data_event and self.data_event.version(event_ts) == self.snapshot_version(psd)
+
+    def compute_events(self, event_ts, psd=False, parallel=True):
+        """
+        Compute the snapshots of many events in one pass per batch: a single
+        read gathers every window into one block, which is then filtered and
+        reduced by batched calls. Snapshots are stored as compute_event does;
+        returns them in `event_ts` order.
+        """
+        version = self.snapshot_version(psd)
+        event_ts = [int(ts) for ts in event_ts]
+        results = {}
+
+        # Windows clipped by the start of the recording are shorter: one at a time
+        full = []
+        for ts in event_ts:
+            if ts < self.snapshot_len:
+                results[ts] = self.compute_event(ts, psd=psd)
+            else:
+                full.append(ts)
+
+        batch_size = self.event_batch_size()
+        for i in range(0, len(full), batch_size):
+            batch = full[i:i + batch_size]
+            bases = None if psd else [self.snapshot_basis(ts) for ts in batch]
+            snapshots = self.process_snapshots(self.gather_events(batch), psd, parallel=parallel, bases=bases)
+            for ts, snapshot in zip(batch, snapshots):
+                # own copy, so the store accounts and spills each snapshot on its own
+                snapshot = snapshot.copy()
+                self.data_event.put(ts, snapshot, version)
+                results[ts] = snapshot
+
+        return [results[ts] for ts in event_ts]
+
+    def event_batch_size(self):
+        """Events gathered per batch, keeping the raw and filtered blocks within gather_budget."""
+        window_bytes = 2 * self.snapshot_len * self.num_channel * (np.dtype(np.int16).itemsize + self.precision.itemsize)
+        return max(1, int(self.gather_budget // max(window_bytes, 1)))
+
+    def gather_events(self, event_ts, wait=True):
+        """Raw windows of `event_ts` read from the file in one go, shaped (events, samples, rows, cols)."""
+        event_ts = np.asarray(event_ts, dtype=np.int64)
+        reader = self.get_reader()
+        if wait and len(event_ts):
+            self._wait_for_samples(reader, int(event_ts.max()) + self.snapshot_len)
+        return reader.gather(event_ts - self.snapshot_len, 2 * self.snapshot_len)
+
+    def get_event_slice(self, event_ts):
         start = max(0, event_ts - self.snapshot_len)
         stop = event_ts + self.snapshot_len
-        signal = self.get_data_slice(start, stop)
+        return self.get_data_slice(start, stop)
 
-        if not psd: 
-            if self.sos_all is not None:
-                try:
-                    signal = signal - np.mean(signal, axis=0)
-                    signal = sosfiltfilt(self.sos_all, signal, axis=0)
-                except Exception as e:
-                    print("event Filter error:", e)
-            if self.denoise: 
-                signal = self.apply_denoise(signal)
-
-        reshaped = signal.reshape(
-            (signal.shape[0],
-             int(self.nbr_row/self.row_divider), self.row_divider,
-             int(self.nbr_col/self.col_divider), self.col_divider)
-        )
-        reshaped = reshaped.transpose(1, 3, 0, 2, 4).reshape(
-            (int(self.num_channel/(self.col_divider*self.row_divider)),
-             signal.shape[0], self.row_divider, self.col_divider)
-        )
-        meaned = np.mean(reshaped, axis=(2, 3))
-        self.data_event[event_ts] = meaned
+    def process_snapshot(self, signal, psd=False, parallel=False, basis=None):
+        """
+        Filter, denoise and reduce a raw (samples, rows, cols) slice to (cells, samples).
+        parallel shards the filtering over filter_workers threads; leave it off
+        when snapshots are already processed concurrently. basis is the
+        event's snapshot_basis, for the projection denoise.
+        """
+        if not psd and self.denoise:
+            # SVD denoise needs every electrode: filter first, reduce last
+            signal = self.filter_signal(signal, axis=0, parallel=parallel)
+            signal = self.apply_denoise(signal, basis)
+            meaned = self.reduce_cells(signal)
+        else:
+            # Mean subtraction and filters are linear: average the cells first,
+            # filter row_divider * col_divider times fewer channels
+            meaned = self.reduce_cells(signal)
+            if not psd:
+                meaned = self.filter_signal(meaned, axis=1, parallel=parallel)
+
+        return meaned
+
+    def process_snapshots(self, block, psd=False, parallel=False, bases=None):
+        """
+        process_snapshot over a (events, samples, rows, cols) block, giving
+        (events, cells, samples). Every window is filtered by the same calls;
+        only the denoise, with each event's own basis, runs event by event.
+        """
+        if not psd and self.denoise:
+            block = self.filter_signal(block, axis=1, parallel=parallel)
+            if bases is None:
+                bases = [None] * len(block)
+
+            def denoise_window(signal, basis):
+                return self.reduce_cells(self.apply_denoise(signal, basis))
 
+            if parallel and self.filter_workers > 1 and len(block) > 1:
+                return np.stack(list(self._get_filter_pool().map(denoise_window, block, bases)))
+            return np.stack([denoise_window(signal, basis) for signal, basis in zip(block, bases)])
+
+        meaned = self.reduce_cells(block)
+        if not psd:
+            meaned = self.filter_signal(meaned, axis=-1, parallel=parallel)
         return meaned
 
+    def filter_signal(self, signal, axis=0, parallel=False):
+        """Mean-subtract and zero-phase filter `signal` along the sample axis."""
+        if self.sos_all is None:
+            return signal
+        signal = np.asarray(signal, dtype=self.precision)
+        try:
+            signal = signal - np.mean(signal, axis=axis, keepdims=True)
+            signal = self.zero_phase_filter(signal, axis=axis, parallel=parallel)
+        except Exception as e:
+            print("event Filter error:", e)
+        return signal
+
+    def zero_phase_filter(self, signal, axis=0, parallel=False):
+        """Apply sos_all forward and backward, with the selected filter backend."""
+        if parallel and self.filter_workers > 1:
+            return self._sharded_filter(signal, axis)
+        if self.filter_backend == "fft":
+            signal = self._fft_filter.apply(signal, axis=axis)
+        else:
+            signal = sosfiltfilt(self.sos_all, signal, axis=axis)
+        return signal.astype(self.precision, copy=False)
+
+    def _sharded_filter(self, signal, axis):
+        """
+        zero_phase_filter with a channel axis (the first with more than one
+        entry) split into filter_workers shards. Each thread filters its shard into a preallocated output;
+        sosfiltfilt and the FFTs release the GIL, so shards run on separate cores.
+        """
+        axis = axis % signal.ndim
+        channel_axes = [a for a in range(signal.ndim) if a != axis]
+        shard_axis = next((a for a in channel_axes if signal.shape[a] > 1), channel_axes[0])
+        n_channels = signal.shape[shard_axis]
+        n_shards = min(self.filter_workers, n_channels)
+        if n_shards < 2:
+            return self.zero_phase_filter(signal, axis)
+
+        out = np.empty(signal.shape, dtype=self.precision)
+        bounds = np.linspace(0, n_channels, n_shards + 1).astype(int)
+
+        def filter_shard(start, stop):
+            index = [slice(None)] * signal.ndim
+            index[shard_axis] = slice(start, stop)
+            index = tuple(index)
+            out[index] = self.zero_phase_filter(signal[index], axis)
+
+        pool = self._get_filter_pool()
+        futures = [pool.submit(filter_shard, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            future.result()
+        return out
+
+    def _get_filter_pool(self):
+        with self._filter_pool_lock:
+            if self._filter_pool is None or self._filter_pool_size != self.filter_workers:
+                if self._filter_pool is not None:
+                    self._filter_pool.shutdown(wait=False)
+                self._filter_pool = ThreadPoolExecutor(max_workers=self.filter_workers, thread_name_prefix="filter")
+                self._filter_pool_size = self.filter_workers
+            return self._filter_pool
+
+    def close(self):
+        with self._filter_pool_lock:
+            if self._filter_pool is not None:
+                self._filter_pool.shutdown(wait=False)
+                self._filter_pool = None
+        self.data_event.close()
+        self.data_psd.close()
+
+    def reduce_cells(self, signal):
+        """Average (..., samples, rows, cols) into display cells, shaped (..., cells, samples)."""
+        leading = signal.shape[:-3]
+        n_samples = signal.shape[-3]
+        n_row_cells = int(self.nbr_row/self.row_divider)
+        n_col_cells = int(self.nbr_col/self.col_divider)
+        # Sum the probe rows of each cell band (contiguous runs of nbr_col values),
+        # then the few columns of each cell: several times faster than np.mean
+        # over the two strided axes at once
+        rows = signal.reshape(-1, self.row_divider, self.nbr_col)
+        summed = np.add.reduce(rows, axis=1, dtype=self.precision).reshape(-1, n_col_cells, self.col_divider)
+        meaned = summed[..., 0].copy()
+        for i in range(1, self.col_divider):
+            meaned += summed[..., i]
+        meaned /= self.row_divider * self.col_divider
+
+        meaned = meaned.reshape(leading + (n_samples, n_row_cells * n_col_cells))
+        return np.ascontiguousarray(np.moveaxis(meaned, -2, -1))
+
     def reset_xy(self, event_duration=100):
 
+        self.event_duration = event_duration
         half_snapshot_sec = event_duration / 1000.0
         self.snapshot_len = int(half_snapshot_sec * self.fs)
 
         n_samples = 2 * self.snapshot_len
         self.x = np.linspace(-event_duration, event_duration, n_samples, endpoint=True)
+        self._split_memory_budget()
 
         y = np.ones(n_samples)
         y = np.tile(y, (int(self.nbr_col/self.col_divider)*int(self.nbr_row/self.row_divider), 1))
         return self.x, y
 
+    def set_event_memory_budget(self, nbytes):
+        """RAM budget in bytes (None for unlimited) shared by the event snapshots and their PSDs."""
+        self.event_memory_budget = nbytes
+        self._split_memory_budget()
+
+    def _split_memory_budget(self):
+        # In proportion to one snapshot and one PSD, so both stores keep as many events in RAM
+        total = self.event_memory_budget
+        if total is None or self.snapshot_len is None:
+            self.data_event.memory_budget = total
+            self.data_psd.memory_budget = total
+            return
+        n_samples = 2 * self.snapshot_len
+        n_freqs = len(self.psd_freqs())
+        psd_budget = total * n_freqs // (n_samples + n_freqs)
+        self.data_event.memory_budget = total - psd_budget
+        self.data_psd.memory_budget = psd_budget
+
     def get_event(self, ts):
         return self.data_event[ts]
 
-    def add_event(self, info):
+    def add_event(self, info, psd=False):
         print("event " + str(info['sample_number']))
-        self.compute_event(info['sample_number'])
\ No newline at end of file
+        self.compute_event(info['sample_number'], psd=psd)
+
+    def add_events(self, infos, psd=False):
+        for info in infos:
+            print("event " + str(info['sample_number']))
+        self.compute_events([info['sample_number'] for info in infos], psd=psd)
\ No newline at end of file
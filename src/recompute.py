@@ -0,0 +1,146 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+def _process_in_worker(model, signal, psd, basis):
+    return model.process_snapshot(signal, psd, basis=basis)
+
+
+class RecomputeEngine:
+    """
+    Recompute many event snapshots in parallel.
+
+    backend="thread" hands batches of events to Model.compute_events: each
+    batch is one read of every window and one batched filter pass, sharded
+    over the model's filter_workers threads (sosfiltfilt / numpy / BLAS
+    release the GIL). backend="process" slices in the calling thread and
+    ships each raw window plus the filter settings to a process pool of
+    max_workers, for work that holds the GIL.
+
+    Runs may overlap (a view refresh and the background refresh): each
+    event is claimed by one run at a time, and the others wait for it
+    instead of computing it twice.
+    """
+
+    def __init__(self, max_workers=None, backend="thread"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.backend = backend
+        self._pool = None
+        self._pool_key = None
+        self._lock = threading.Lock()
+        self._in_flight = {}  # (ts, version) -> threading.Event set once it landed
+
+    def _get_pool(self):
+        key = (self.backend, self.max_workers)
+        if self._pool is None or self._pool_key != key:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pool_key = key
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def run(self, model, event_ts, psd=False, on_result=None, cancelled=None):
+        """
+        Recompute the snapshot of every timestamp in `event_ts` into model.data_event.
+
+        on_result(ts) is called from the calling thread as each snapshot lands,
+        batch by batch, so the view can refresh progressively.
+        cancelled() is polled between batches; once it returns True the
+        remaining work is dropped. Returns False if the run was cancelled.
+        """
+        pending = list(dict.fromkeys(event_ts))
+        version = model.snapshot_version(psd)
+        use_processes = self.backend == "process" and self.max_workers > 1 and len(pending) > 1
+        batch_size = len(pending) if use_processes else model.event_batch_size()
+
+        while pending:
+            if cancelled is not None and cancelled():
+                return False
+            batch = self._claim(pending, version, batch_size, lambda ts: model.is_fresh(ts, psd))
+            if not batch:
+                # everything left is being computed by another run
+                self._wait_any(pending, version)
+            elif use_processes:
+                if not self._run_processes(model, batch, psd, version, on_result, cancelled):
+                    return False
+            else:
+                try:
+                    model.compute_events(batch, psd=psd)
+                except Exception as e:
+                    print(f"Recompute error for events {batch[0]}-{batch[-1]}: {e}")
+                finally:
+                    self._release(batch, version)
+                if on_result is not None:
+                    for ts in batch:
+                        if model.is_fresh(ts, psd):
+                            on_result(ts)
+
+            # drop what landed, from this run or another (failed events are not retried)
+            done = set(batch)
+            pending = [ts for ts in pending if ts not in done and not model.is_fresh(ts, psd)]
+        return True
+
+    def _run_processes(self, model, batch, psd, version, on_result, cancelled):
+        pool = self._get_pool()
+        futures = {}
+        try:
+            for ts in batch:
+                signal = np.ascontiguousarray(model.get_event_slice(ts))
+                basis = None if psd else model.snapshot_basis(ts)
+                futures[pool.submit(_process_in_worker, model, signal, psd, basis)] = ts
+
+            for future in as_completed(futures):
+                if cancelled is not None and cancelled():
+                    for f in futures:
+                        f.cancel()
+                    return False
+                ts = futures[future]
+                try:
+                    model.data_event.put(ts, future.result(), version)
+                except Exception as e:
+                    print(f"Recompute error for event {ts}: {e}")
+                    continue
+                finally:
+                    self._release([ts], version)
+                if on_result is not None:
+                    on_result(ts)
+            return True
+        finally:
+            # whatever was not released yet (cancelled, or failed to submit)
+            self._release(batch, version)
+
+    def _claim(self, pending, version, limit, landed):
+        """
+        Up to `limit` events of `pending` that no other run is computing, now
+        claimed by this one. landed(ts) skips those another run finished since.
+        """
+        batch = []
+        with self._lock:
+            for ts in pending:
+                key = (ts, version)
+                if key not in self._in_flight and not landed(ts):
+                    self._in_flight[key] = threading.Event()
+                    batch.append(ts)
+                    if len(batch) == limit:
+                        break
+        return batch
+
+    def _release(self, batch, version):
+        with self._lock:
+            for ts in batch:
+                landed = self._in_flight.pop((ts, version), None)
+                if landed is not None:
+                    landed.set()
+
+    def _wait_any(self, pending, version, timeout=0.05):
+        """Wait for one of the other runs' events to land (or `timeout`, to poll cancellation)."""
+        with self._lock:
+            landed = next((self._in_flight[(ts, version)] for ts in pending if (ts, version) in self._in_flight), None)
+        if landed is not None:
+            landed.wait(timeout)
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity circular buffer indexed by absolute sample number.
+
+    Samples are stored along the first axis. Appending never reallocates:
+    new samples overwrite the oldest ones once the buffer is full, so the
+    ingest cost only depends on the size of the appended chunk.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._buffer = np.zeros((self.capacity,) + self.shape, dtype=self.dtype)
+        self._write_index = 0    # position of the next write in _buffer
+        self._length = 0         # number of valid samples held
+        self.total_samples = 0   # absolute sample index one past the newest written
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def start_sample(self):
+        """Absolute sample index of the oldest sample held."""
+        return self.total_samples - len(self)
+
+    @property
+    def end_sample(self):
+        """Absolute sample index one past the newest sample held."""
+        return self.total_samples
+
+    def reset(self, start_sample=0):
+        """Drop all samples; the next append starts at absolute index start_sample."""
+        self._write_index = 0
+        self._length = 0
+        self.total_samples = start_sample
+
+    def append(self, chunk):
+        chunk = np.asarray(chunk).reshape((-1,) + self.shape)
+        n = chunk.shape[0]
+        if n == 0:
+            return
+
+        if n >= self.capacity:
+            # Only the newest `capacity` samples survive
+            self._buffer[:] = chunk[n - self.capacity:]
+            self._write_index = 0
+            self._length = self.capacity
+            self.total_samples += n
+            return
+
+        first = min(n, self.capacity - self._write_index)
+        self._buffer[self._write_index:self._write_index + first] = chunk[:first]
+        if first < n:
+            self._buffer[:n - first] = chunk[first:]
+        self._write_index = (self._write_index + n) % self.capacity
+        self._length = min(self._length + n, self.capacity)
+        self.total_samples += n
+
+    def contains(self, start_sample, stop_sample):
+        return start_sample >= self.start_sample and stop_sample <= self.end_sample
+
+    def segments(self, start_sample=None, stop_sample=None):
+        """
+        Return the samples in [start_sample, stop_sample) as a list of one or
+        two views into the buffer (no copy). Bounds default to the full buffer.
+        """
+        if start_sample is None:
+            start_sample = self.start_sample
+        if stop_sample is None:
+            stop_sample = self.end_sample
+        if not self.contains(start_sample, stop_sample):
+            raise IndexError(
+                f"Samples [{start_sample}, {stop_sample}) not in buffer "
+                f"[{self.start_sample}, {self.end_sample})"
+            )
+        n = stop_sample - start_sample
+        if n <= 0:
+            return [self._buffer[:0]]
+
+        # Physical position of start_sample: the newest sample sits just before _write_index
+        begin = (self._write_index - (self.end_sample - start_sample)) % self.capacity
+        end = begin + n
+        if end <= self.capacity:
+            return [self._buffer[begin:end]]
+        return [self._buffer[begin:], self._buffer[:end - self.capacity]]
+
+    def read(self, start_sample=None, stop_sample=None, out=None):
+        """Copy [start_sample, stop_sample) into a contiguous array (or `out`)."""
+        segments = self.segments(start_sample, stop_sample)
+        n = sum(s.shape[0] for s in segments)
+        if out is None:
+            out = np.empty((n,) + self.shape, dtype=self.dtype)
+        pos = 0
+        for s in segments:
+            out[pos:pos + s.shape[0]] = s
+            pos += s.shape[0]
+        return out
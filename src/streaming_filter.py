@@ -0,0 +1,45 @@
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+from ring_buffer import RingBuffer
+
+
+class StreamingFilter:
+    """
+    Causal SOS filter applied incrementally to a sample stream.
+
+    Per-channel filter state (`zi`) is carried between calls so each call
+    only filters the newly ingested samples. The output is kept in a ring
+    of the same capacity as the raw rolling buffer.
+    """
+
+    def __init__(self, sos, capacity, shape, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.sos = np.asarray(sos, dtype=self.dtype)
+        self.filtered = RingBuffer(capacity, shape, dtype=self.dtype)
+        self._zi = None
+
+    @property
+    def end_sample(self):
+        return self.filtered.end_sample
+
+    def reset(self, start_sample=0):
+        self.filtered.reset(start_sample)
+        self._zi = None
+
+    def process(self, samples, start_sample):
+        """Filter `samples`, whose first sample is at absolute index start_sample."""
+        if start_sample != self.filtered.end_sample:
+            # Gap or restart in the stream: the previous state is meaningless
+            self.reset(start_sample)
+        if samples.shape[0] == 0:
+            return
+
+        x = samples.astype(self.dtype)
+        if self._zi is None:
+            # Start in steady state for the first sample to avoid a step transient
+            zi = sosfilt_zi(self.sos).astype(self.dtype)
+            self._zi = zi.reshape(zi.shape + (1,) * (x.ndim - 1)) * x[0]
+
+        y, self._zi = sosfilt(self.sos, x, axis=0, zi=self._zi)
+        self.filtered.append(y)
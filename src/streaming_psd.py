@@ -0,0 +1,75 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import windows
+
+from ring_buffer import RingBuffer
+
+
+class StreamingWelch:
+    """
+    Welch PSD of a sample stream, updated incrementally.
+
+    Segments of `nperseg` samples with 50% overlap are cut from the stream as
+    soon as they are complete, and their periodograms are computed in one
+    batched rfft across all channels. The last `max_segments` periodograms
+    are kept, so the estimate covers the same span as the rolling buffer
+    without re-transforming old samples. Matches scipy.signal.welch (Hann
+    window, constant detrend, density scaling, mean average) on that span.
+    """
+
+    def __init__(self, fs, capacity, shape, nperseg=256, dtype=np.float64):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg // 2
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+
+        self.window = windows.hann(nperseg).astype(self.dtype)
+        self.freqs = np.fft.rfftfreq(nperseg, 1 / fs)
+        self._scale = np.full(len(self.freqs), 2 / (fs * (self.window ** 2).sum()), dtype=self.dtype)
+        self._scale[0] /= 2
+        if nperseg % 2 == 0:
+            self._scale[-1] /= 2   # Nyquist bin has no negative-frequency twin
+
+        max_segments = max(1, (capacity - nperseg) // self.step + 1)
+        self.periodograms = RingBuffer(max_segments, self.shape + (len(self.freqs),), dtype=self.dtype)
+        self._tail = np.zeros((0,) + self.shape, dtype=self.dtype)
+        self._end_sample = 0
+
+    @property
+    def end_sample(self):
+        return self._end_sample
+
+    def reset(self, start_sample=0):
+        self.periodograms.reset()
+        self._tail = self._tail[:0]
+        self._end_sample = start_sample
+
+    def process(self, samples, start_sample):
+        """Add `samples`, whose first sample is at absolute index start_sample."""
+        if start_sample != self._end_sample:
+            # Gap or restart in the stream: segments would straddle it
+            self.reset(start_sample)
+        if samples.shape[0] == 0:
+            return
+        self._end_sample = start_sample + samples.shape[0]
+
+        x = np.concatenate((self._tail, samples.astype(self.dtype)), axis=0)
+        if x.shape[0] < self.nperseg:
+            self._tail = x
+            return
+
+        # (segments, *shape, nperseg), a strided view of x
+        segments = sliding_window_view(x, self.nperseg, axis=0)[::self.step]
+        segments = segments - segments.mean(axis=-1, keepdims=True)
+        spectrum = np.fft.rfft(segments * self.window, axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(self.dtype) * self._scale
+        self.periodograms.append(power)
+
+        self._tail = x[segments.shape[0] * self.step:].copy()
+
+    def psd(self):
+        """Mean periodogram over the kept segments, shaped (*shape, freqs)."""
+        if len(self.periodograms) == 0:
+            return np.zeros(self.shape + (len(self.freqs),), dtype=self.dtype)
+        return sum(seg.sum(axis=0) for seg in self.periodograms.segments()) / len(self.periodograms)
@@ -1,10 +1,9 @@
-import numpy as np
 import panel as pn
 import holoviews as hv
-import panel as pn
 from bokeh.models import Spinner
 import time
-from holoviews.streams import Pipe
+
+from trace_renderer import TraceRenderer
 
 hv.extension('bokeh')
 
@@ -15,86 +14,19 @@ class TimeseriesView(pn.viewable.Viewer):
         self.sub_curves = []
         self.periodic_callback = None
         self.update_period = update_period  # in ms
+        self.max_points = 1000  # samples sent per trace, ~2x the plot width in pixels
         rolling_window = 5000*3
         self.event_drawed = []
 
         self.nbr_col = nbr_col
         self.nbr_row = nbr_row
 
-        self.pipe = Pipe(data=(np.zeros((0,0)), np.zeros((0,1,1))))
+        self.renderer = TraceRenderer()
+        self._view_key = None      # (channels, psd) the renderer currently shows
+        self._end_sample = None    # next live sample to stream, None to resend everything
+        self.rescale_period = 10   # s between full resends, which respace the traces
+        self._last_replace = None  # time of the latest full resend, None to resend on the next tick
 
-        def overlay_with_events(data):
-            elements = []
-            x, y = data
-            offset = 0  # initial vertical offset
-            spacing_factor = 1.5  # how much space between traces (e.g. 10% more than previous max)
-
-            for i, sub in enumerate(self.sub_curves):
-                row = sub['spinner_row'].value
-                col = sub['spinner_col'].value
-                
-                # Bounds checking
-                if row >= y.shape[1] or col >= y.shape[2]:
-                    continue
-                
-                if y.shape[0] == 0:
-                    elements.append(
-                        hv.Curve(([],[]), label=f"(R{row}, C{col})")
-                        .opts(
-                            axiswise=False, 
-                            framewise=True,
-                            line_width=2,  # Thicker lines for visibility
-                        )
-                    )
-                    continue
-
-
-                y_sub = y[:, row, col]
-
-                if self.PSD.value: 
-                    x, y_sub = self.controller.model.compute_psd_with_hanning(y_sub)
-                    
-                y_sub = y_sub + offset
-
-                curve = hv.Curve((x,  y_sub), label=f"(R{row}, C{col})").opts(
-                        axiswise=False, 
-                        framewise=True,
-                        line_width=2,  # Thicker lines for visibility
-                    )
-                if self.PSD.value: 
-                    curve = curve.redim.range(x=(0,200))
-
-                elements.append(curve)
-
-                offset = np.max(y_sub) * spacing_factor
-
-
-            ov = hv.Overlay(elements).opts(
-                yaxis='left',
-                show_grid=True,
-                responsive=True,  # Changed to True for responsiveness
-                show_legend=True,
-                legend_position='top_right',  # Better legend placement
-                legend_offset=(10, 10),
-                tools=['xwheel_zoom', 'ywheel_zoom', 'xpan', 'reset'], 
-                active_tools=['ywheel_zoom'],
-                min_height=500,  # Fixed height for better control
-                xlabel="Time (s)",
-                ylabel="Amplitude",
-                # Font size adjustments
-                fontsize={
-                    'title': 12,
-                    'labels': 10,
-                    'xticks': 8,
-                    'yticks': 8,
-                    'legend': 9
-                },
-                # Tick adjustments to prevent overlap
-                xticks=6,
-                xrotation=45,
-            )
-            return ov
-        
         self.add_sub_button = pn.widgets.Button(
             name="+ Add signal", 
             button_type="primary"
@@ -109,21 +41,9 @@ class TimeseriesView(pn.viewable.Viewer):
         )
         self.add_sub_curve()
 
-        dmap = hv.DynamicMap(
-            lambda data: overlay_with_events(data),
-            streams=[self.pipe]
-        )
-
-        self.plot = dmap
-
-
         self._panel = pn.Column(
             self.controls, 
-            pn.pane.HoloViews(
-                self.plot, 
-                sizing_mode="stretch_both",  # Better responsiveness
-                min_height=400
-            ),
+            self.renderer.pane,
             sizing_mode="stretch_both"
         )
 
@@ -227,13 +147,49 @@ class TimeseriesView(pn.viewable.Viewer):
 
         self.update()
 
-    def update(self, value=None):
-        x_data, y_data = self.controller.get_full_data(psd=bool(self.PSD.value))
+    def selected_channels(self):
+        """(row, col) of every displayed trace that lies on the probe."""
+        channels = []
+        for sub in self.sub_curves:
+            row = sub['spinner_row'].value
+            col = sub['spinner_col'].value
+            # Bounds checking
+            if row < self.nbr_row and col < self.nbr_col:
+                channels.append((row, col))
+        return channels
 
-        if x_data is None:
-            return
-        
-        self.pipe.send((x_data, y_data))
+    def update(self, value=None):
+        channels = self.selected_channels()
+        labels = [f"(R{row}, C{col})" for row, col in channels]
+        psd = bool(self.PSD.value)
+        key = (tuple(channels), psd)
+
+        if psd:
+            x_data, y_data = self.controller.get_full_data(psd=True, channels=channels)
+            if x_data is None:
+                return
+            self.renderer.replace(x_data, y_data, labels, xlim=(0, 200), xlabel="Frequency (Hz)")
+            self._end_sample = None
+        else:
+            # a periodic full resend respaces the traces on the filtered buffer
+            # (past the filter's start-up, as the amplitudes change)
+            respace = self._last_replace is None or time.monotonic() - self._last_replace > self.rescale_period
+            since = self._end_sample if key == self._view_key and not respace else None
+            x_data, y_data, end_sample, delta = self.controller.get_live_update(channels, since, self.max_points)
+            if x_data is None:
+                return
+            if delta:
+                # only the bins completed since the last tick; the whole buffer fits in max_points
+                if not self.renderer.stream(x_data, y_data, rollover=self.max_points or self.controller.model.max_buffer_samples):
+                    # the traces would overlap: respace them on the next tick
+                    self._last_replace = None
+            else:
+                self.renderer.replace(x_data, y_data, labels)
+                self._last_replace = time.monotonic()
+            # keep resending until there is data to lay the traces out on
+            self._end_sample = end_sample if len(x_data) or delta else None
+
+        self._view_key = key
 
     def start_streaming(self):
         if self.periodic_callback is None:
@@ -0,0 +1,109 @@
+from functools import partial
+
+import numpy as np
+import panel as pn
+from bokeh.models import ColumnDataSource, DataRange1d
+from bokeh.palettes import Category10_10
+from bokeh.plotting import figure
+
+from bokeh_schedule import schedule
+
+
+class TraceRenderer:
+    """
+    Stacked live traces in one Bokeh figure, fed by one ColumnDataSource
+    with an "x" column (float64, absolute seconds need it) and one float32
+    "y<i>" column per trace.
+
+    `replace` sends complete traces and fixes the vertical offsets between
+    them; `stream` appends new samples only, with a rollover so the source
+    never grows past the rolling buffer. Only new samples cross the
+    websocket each tick. The offsets stay those of the last replace, so
+    `stream` reports when new samples leave the range they were set for.
+    """
+
+    def __init__(self, spacing_factor=1.5, rescale_margin=0.5):
+        self.spacing_factor = spacing_factor  # space between traces, relative to the previous max
+        self.rescale_margin = rescale_margin  # streamed samples may exceed the replaced range by this much of it
+        self.figure = figure(
+            x_range=DataRange1d(), y_range=DataRange1d(),
+            tools="xwheel_zoom,ywheel_zoom,xpan,reset", active_scroll="ywheel_zoom",
+            sizing_mode="stretch_both", min_height=500,
+            x_axis_label="Time (s)", y_axis_label="Amplitude",
+        )
+        self.figure.xaxis.ticker.desired_num_ticks = 6
+        self.figure.xaxis.major_label_orientation = np.pi / 4
+        self.figure.xaxis.major_label_text_font_size = "8pt"
+        self.figure.yaxis.major_label_text_font_size = "8pt"
+        self.figure.axis.axis_label_text_font_size = "10pt"
+
+        self.source = ColumnDataSource(data=dict(x=np.zeros(0, dtype=np.float32)))
+        self.labels = ()               # traces of the latest replace
+        self._offsets = np.zeros(0)
+        self._range = None             # per-trace (min, max) the offsets were set for
+        self._glyph_labels = ()        # traces currently drawn
+        self.pane = pn.pane.Bokeh(self.figure, sizing_mode="stretch_both", min_height=400)
+
+    def replace(self, x, y, labels, xlim=None, xlabel="Time (s)"):
+        """
+        Show (samples, traces) y over x, recomputing the offsets between traces.
+        Samples outside xlim are dropped, so the auto-ranging axis fits it.
+        """
+        labels = tuple(labels)
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=np.float64).reshape(len(x), len(labels))
+        if xlim is not None:
+            keep = (x >= xlim[0]) & (x <= xlim[1])
+            x, y = x[keep], y[keep]
+
+        offsets = np.zeros(len(labels))
+        offset = 0
+        for i in range(len(labels)):
+            offsets[i] = offset
+            if y.shape[0]:
+                offset = np.max(y[:, i] + offset) * self.spacing_factor
+
+        self.labels = labels
+        self._offsets = offsets
+        self._range = (y.min(axis=0), y.max(axis=0)) if y.shape[0] else None
+        data = self._columns(x, y, offsets)
+        schedule(self.figure, partial(self._apply_replace, data, labels, xlabel))
+
+    def stream(self, x, y, rollover):
+        """
+        Append (samples, traces) y, keeping at most `rollover` samples.
+        Returns False if they leave the range the offsets were set for (the
+        traces would overlap): a replace should respace them.
+        """
+        if len(x) == 0:
+            return True
+        y = np.asarray(y).reshape(len(x), len(self.labels))
+        data = self._columns(x, y, self._offsets)
+        schedule(self.figure, partial(self.source.stream, data, rollover))
+
+        if self._range is None:
+            return False
+        low, high = self._range
+        margin = self.rescale_margin * (high - low)
+        return bool(np.all(y.min(axis=0) >= low - margin) and np.all(y.max(axis=0) <= high + margin))
+
+    def _columns(self, x, y, offsets):
+        data = dict(x=np.asarray(x, dtype=np.float64))
+        for i in range(y.shape[1]):
+            data[f"y{i}"] = (y[:, i] + offsets[i]).astype(np.float32)
+        return data
+
+    def _apply_replace(self, data, labels, xlabel):
+        if labels != self._glyph_labels:
+            self.figure.renderers = []
+            if self.figure.legend:
+                self.figure.legend.items = []
+            for i, label in enumerate(labels):
+                self.figure.line("x", f"y{i}", source=self.source, line_width=2,
+                                 color=Category10_10[i % 10], legend_label=label)
+            if labels:
+                self.figure.legend.location = "top_right"
+                self.figure.legend.label_text_font_size = "9pt"
+            self._glyph_labels = labels
+        self.source.data = data
+        self.figure.xaxis.axis_label = xlabel
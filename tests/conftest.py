@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+N_ROWS, N_COLS = 8, 12
+N_SAMPLES = 4000
+
+
+def write_recording(path):
+    """Small interleaved int16 continuous.dat: a 50 Hz line, an 8 Hz rhythm, noise and per-channel offsets."""
+    rng = np.random.default_rng(0)
+    t = np.arange(N_SAMPLES) / 1953.12
+    data = rng.normal(0, 200, (N_SAMPLES, N_ROWS, N_COLS))
+    data += 300 * np.sin(2 * np.pi * 50 * t)[:, None, None]
+    data += 500 * np.sin(2 * np.pi * 8 * t)[:, None, None] * rng.uniform(0.5, 1.5, (N_ROWS, N_COLS))
+    data += rng.uniform(-1000, 1000, (N_ROWS, N_COLS))
+    data = data.astype(np.int16)
+
+    data.tofile(path)
+    return data
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "continuous.dat"
+    return path, write_recording(path)
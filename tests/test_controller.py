@@ -0,0 +1,49 @@
+import numpy as np
+
+from conftest import N_COLS, N_ROWS
+from controller import Controller
+
+EVENTS = [600, 1000, 1400, 1800, 2200, 2600, 3000]
+
+
+def make_controller(path):
+    controller = Controller()
+    controller.setup_event_view(N_ROWS * N_COLS, N_COLS, N_ROWS, 3, 2)
+    controller.model.file = path
+    controller.model.setup_filters(1, 200, 4, [(50, 2)], False)
+    controller.model.event_batch_size = lambda: 2
+    controller.events = {str(ts): ts for ts in EVENTS}
+    controller.special_events["Average"] = list(EVENTS)
+    controller.event_type = "Average"
+    return controller
+
+
+def test_group_refresh_shows_partial_averages(recording):
+    path, _ = recording
+    controller = make_controller(path)
+    model = controller.model
+    controller.get_data_event(sem=True)
+
+    # a filter change leaves every member stale
+    model.setup_filters(1, 150, 4, [(50, 2)], False)
+    partial = []
+    x, y, band = controller.get_data_event(sem=True, on_partial=lambda *view: partial.append(view))
+
+    assert len(partial) == len(EVENTS)
+    assert controller.group_stats["Average"].count == len(EVENTS)
+    np.testing.assert_allclose(partial[0][1], model.data_event[EVENTS[0]])
+    np.testing.assert_allclose(partial[-1][1], y)
+    np.testing.assert_allclose(partial[-1][2], band)
+    expected = np.mean([model.data_event[ts] for ts in EVENTS], axis=0)
+    np.testing.assert_allclose(y, expected, rtol=1e-6, atol=1e-9 * np.abs(expected).max())
+    controller.close()
+
+
+def test_recompute_backend_setting(recording):
+    path, _ = recording
+    controller = make_controller(path)
+    controller.update_recompute_backend("process")
+    assert controller.recompute.backend == "process"
+    controller.update_recompute_backend("thread")
+    assert controller.recompute.backend == "thread" and controller.recompute._pool is None
+    controller.close()
@@ -0,0 +1,31 @@
+import numpy as np
+
+from decimation import minmax_decimate_aligned
+
+
+def test_aligned_pieces_match_one_pass():
+    rng = np.random.default_rng(0)
+    start, bin_size = 37, 8
+    y = rng.normal(size=(1000, 3))
+    x = np.arange(start, start + len(y)) / 100
+
+    x_all, y_all, end_all = minmax_decimate_aligned(x, y, start, bin_size, axis=0)
+    assert end_all % bin_size == 0 and x_all[0] == 40 / 100
+
+    xs, ys = [], []
+    since = start
+    for stop in np.r_[np.sort(rng.choice(np.arange(start + 1, start + 1000), 30, replace=False)), start + 1000]:
+        piece = slice(since - start, stop - start)
+        x_part, y_part, since = minmax_decimate_aligned(x[piece], y[piece], since, bin_size, axis=0)
+        xs.append(x_part)
+        ys.append(y_part)
+
+    assert since == end_all
+    np.testing.assert_array_equal(np.concatenate(xs), x_all)
+    np.testing.assert_array_equal(np.concatenate(ys), y_all)
+    assert len(x_all) == 2 * ((start + 1000) // bin_size - (start + bin_size - 1) // bin_size)
+
+
+def test_aligned_without_complete_bin():
+    x, y, end = minmax_decimate_aligned(np.arange(5.0), np.arange(5.0), 9, 8)
+    assert len(x) == 0 and len(y) == 0 and end == 9
@@ -0,0 +1,37 @@
+import numpy as np
+
+from event_store import EventStore
+
+
+def test_spilled_read_survives_slot_reuse(tmp_path):
+    snapshot_bytes = 4 * 10 * 8
+    store = EventStore(memory_budget=snapshot_bytes, spill_dir=tmp_path)
+    for ts in range(4):
+        store.put(ts, np.full((4, 10), ts, dtype=np.float64))
+
+    early = store[0]  # spilled by now
+    assert 0 in store._spilled
+
+    # overwriting event 0 frees its slot, the next spill reuses it
+    store.put(0, np.full((4, 10), 100.0))
+    for ts in range(10, 13):
+        store.put(ts, np.full((4, 10), ts, dtype=np.float64))
+
+    np.testing.assert_array_equal(early, 0)
+    for ts in [1, 2, 3, 0, 10, 11, 12]:
+        np.testing.assert_array_equal(store[ts], 100.0 if ts == 0 else ts)
+    store.close()
+
+
+def test_group_mean_through_spills(tmp_path):
+    store = EventStore(memory_budget=1000, spill_dir=tmp_path)
+    rng = np.random.default_rng(0)
+    snapshots = {ts: rng.normal(size=(6, 50)) for ts in range(20)}
+    for ts, snapshot in snapshots.items():
+        store.put(ts, snapshot, version="v")
+
+    assert store.memory_bytes <= 1000 or len(store._hot) == 1
+    mean = np.mean([store[ts] for ts in snapshots], axis=0)
+    np.testing.assert_allclose(mean, np.mean(list(snapshots.values()), axis=0))
+    assert all(store.version(ts) == "v" for ts in snapshots)
+    store.close()
@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+from scipy.signal import sosfiltfilt
+
+from conftest import N_COLS, N_ROWS
+from model import Model
+
+EVENT = 2000
+
+
+def make_model(path, col_divider=3, row_divider=2, precision="float64", denoise=False):
+    model = Model(N_ROWS * N_COLS, N_COLS, N_ROWS, col_divider, row_divider, precision=precision)
+    model.file = path
+    model.setup_filters(1, 200, 4, [(50, 2)], denoise)
+    model.reset_xy(100)
+    return model
+
+
+def filter_first(model, signal):
+    """The original order: mean-subtract, filter every electrode, then average the cells."""
+    signal = np.asarray(signal, dtype=np.float64)
+    signal = signal - signal.mean(axis=0)
+    filtered = sosfiltfilt(model.sos_all.astype(np.float64), signal, axis=0)
+    n_samples = filtered.shape[0]
+    cells = filtered.reshape(n_samples, N_ROWS // model.row_divider, model.row_divider,
+                             N_COLS // model.col_divider, model.col_divider).mean(axis=(2, 4))
+    return cells.reshape(n_samples, -1).T
+
+
+@pytest.mark.parametrize("col_divider, row_divider", [(3, 2), (4, 4), (1, 1), (12, 8)])
+def test_reduced_first_matches_filter_first(recording, col_divider, row_divider):
+    path, _ = recording
+    model = make_model(path, col_divider, row_divider)
+    signal = model.get_event_slice(EVENT)
+
+    reduced_first = model.process_snapshot(signal)
+    expected = filter_first(model, signal)
+
+    assert reduced_first.shape == expected.shape
+    np.testing.assert_allclose(reduced_first, expected, rtol=0, atol=1e-9 * np.abs(expected).max())
+
+
+def relative_error(a, b):
+    return np.abs(a.astype(np.float64) - b).max() / np.abs(b).max()
+
+
+def test_float32_event_dtype_and_error(recording):
+    path, _ = recording
+    single = make_model(path, precision="float32")
+    double = make_model(path, precision="float64")
+
+    signal = single.get_event_slice(EVENT)
+    assert single.sos_all.dtype == np.float32
+    assert single.reduce_cells(signal).dtype == np.float32
+    assert single.filter_signal(signal, axis=0).dtype == np.float32
+
+    snapshot = single.compute_event(EVENT)
+    assert snapshot.dtype == np.float32
+    assert single.data_event[EVENT].dtype == np.float32
+    assert relative_error(snapshot, double.compute_event(EVENT)) < 5e-3
+
+
+def test_float32_denoise_dtype_and_error(recording):
+    path, _ = recording
+    single = make_model(path, precision="float32", denoise=True)
+    double = make_model(path, precision="float64", denoise=True)
+
+    filtered = single.filter_signal(single.get_event_slice(EVENT), axis=0)
+    np.random.seed(0)  # TruncatedSVD draws from the global generator
+    assert single.apply_denoise(filtered).dtype == np.float32
+
+    np.random.seed(0)
+    snapshot = single.compute_event(EVENT)
+    np.random.seed(0)
+    reference = double.compute_event(EVENT)
+    assert snapshot.dtype == np.float32
+    assert relative_error(snapshot, reference) < 2e-2
+
+
+@pytest.mark.parametrize("live_filter_mode", ["causal", "zero_phase"])
+def test_float32_full_signal_dtype_and_error(recording, live_filter_mode):
+    _, data = recording
+    results = {}
+    for precision in ("float32", "float64"):
+        model = make_model(None, precision=precision)
+        model.live_filter_mode = live_filter_mode
+        model.data.append(data[-model.max_buffer_samples:])
+        x, y = model.get_full_signal(channels=[(0, 0), (3, 5), (7, 11)])
+        assert y.dtype == np.dtype(precision)
+        results[precision] = y
+
+    assert relative_error(results["float32"], results["float64"]) < 5e-3
+
+
+@pytest.mark.parametrize("method, refit_every", [("calibration", 0), ("calibration", 1), ("running", 0)])
+def test_denoised_snapshots_do_not_depend_on_order(recording, method, refit_every):
+    path, _ = recording
+    events = [600, 2000, 3000]
+    snapshots = []
+    for order in (events, events[::-1]):
+        model = make_model(path)
+        model.configure_denoise(method, refit_every)
+        model.setup_filters(1, 200, 4, [(50, 2)], True)
+        # the live view denoises with its own basis
+        model.apply_denoise(model.filter_signal(model.get_data_slice(0, 500), axis=0))
+        for ts in order:
+            model.compute_event(ts)
+        snapshots.append([model.data_event[ts] for ts in events])
+
+    for first, second in zip(*snapshots):
+        np.testing.assert_allclose(first, second, rtol=0, atol=1e-9 * np.abs(first).max())
+
+
+def test_denoise_mode_and_refit_outdate_snapshots(recording):
+    path, _ = recording
+    model = make_model(path)
+    model.configure_denoise("calibration", 0)
+    model.setup_filters(1, 200, 4, [(50, 2)], True)
+    model.compute_event(EVENT)
+    assert model.is_fresh(EVENT)
+
+    model.configure_denoise("calibration", 5)
+    assert not model.is_fresh(EVENT)
+    model.compute_event(EVENT)
+    model.configure_denoise("running", 5)
+    assert not model.is_fresh(EVENT)
+
+
+def test_snapshots_and_psds_share_the_memory_budget(recording, tmp_path):
+    path, _ = recording
+    model = make_model(path)
+    model.data_event.spill_dir = model.data_psd.spill_dir = tmp_path
+    budget = 400 * 2**10
+    model.set_event_memory_budget(budget)
+
+    events = list(range(400, 3600, 100))
+    model.compute_events(events)
+    model.get_event_psds(events)
+
+    assert model.data_event.memory_budget + model.data_psd.memory_budget == budget
+    assert model.data_event.memory_bytes + model.data_psd.memory_bytes <= budget
+    model.close()
+
+
+def test_fft_backend_matches_sosfiltfilt(recording):
+    path, _ = recording
+    model = make_model(path)
+    reference = model.compute_event(EVENT)
+    model.filter_backend = "fft"
+    model.setup_filters(1, 200, 4, [(50, 2)], False)
+    np.testing.assert_allclose(model.compute_event(EVENT), reference, rtol=0, atol=1e-9 * np.abs(reference).max())
+
+    # long enough for the FFT path itself, edges included
+    fft = model._fft_filter
+    x = np.random.default_rng(0).normal(size=(fft.min_length + 1000, 3)).cumsum(axis=0)
+    expected = sosfiltfilt(model.sos_all, x, axis=0)
+    np.testing.assert_allclose(fft.apply(x, axis=0), expected, rtol=0, atol=1e-8 * np.abs(expected).max())
+
+
+def test_running_basis_fits_a_bounded_history(recording):
+    path, _ = recording
+    model = make_model(path)
+    model.calibration_seconds = 0.05  # ~100-sample epochs, event 3000 lies in epoch 30
+    model.configure_denoise("running", 0)
+    model.setup_filters(1, 200, 4, [(50, 2)], True)
+    fold = model.denoiser._fold
+    folds = []
+    model.denoiser._fold = lambda sketch, data: folds.append(1) or fold(sketch, data)
+
+    model.compute_event(3000)
+    assert len(folds) == model.denoiser.history
+
+    # the same settings keep the bases, new ones refit the same bounded history
+    model.setup_filters(1, 200, 4, [(50, 2)], True)
+    model.compute_event(3000)
+    assert len(folds) == model.denoiser.history
+    model.setup_filters(1, 150, 4, [(50, 2)], True)
+    model.compute_event(3000)
+    assert len(folds) == 2 * model.denoiser.history
@@ -0,0 +1,46 @@
+import threading
+
+from recompute import RecomputeEngine
+from test_model import make_model
+
+EVENTS = [600, 1000, 1400, 1800, 2200, 2600, 3000]
+
+
+def test_overlapping_runs_compute_each_event_once(recording):
+    path, _ = recording
+    model = make_model(path)
+    computed = []
+    compute_events = model.compute_events
+
+    def counting(event_ts, psd=False, parallel=True):
+        computed.extend(event_ts)
+        return compute_events(event_ts, psd=psd, parallel=parallel)
+
+    model.compute_events = counting
+    model.event_batch_size = lambda: 2
+
+    engine = RecomputeEngine()
+    runs = [threading.Thread(target=engine.run, args=(model, EVENTS)) for _ in range(3)]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join()
+
+    assert sorted(computed) == EVENTS
+    assert all(model.is_fresh(ts) for ts in EVENTS)
+    engine.close()
+
+
+def test_cancelled_run_stops_between_batches(recording):
+    path, _ = recording
+    model = make_model(path)
+    model.event_batch_size = lambda: 2
+    landed = []
+
+    engine = RecomputeEngine()
+    done = engine.run(model, EVENTS, on_result=landed.append, cancelled=lambda: len(landed) >= 2)
+
+    assert not done
+    assert landed == EVENTS[:2]
+    assert not model.is_fresh(EVENTS[-1])
+    engine.close()
@@ -0,0 +1,15 @@
+import numpy as np
+
+from trace_renderer import TraceRenderer
+
+
+def test_stream_reports_samples_outside_the_spaced_range():
+    renderer = TraceRenderer()
+    x = np.arange(100) / 100
+    y = np.stack((np.sin(10 * x), 2 * np.cos(10 * x)), axis=1)
+    renderer.replace(x, y, ["a", "b"])
+
+    x_new = 1 + np.arange(10) / 100
+    assert renderer.stream(x_new, 0.9 * y[:10], rollover=200)
+    assert not renderer.stream(x_new, 10 * y[:10], rollover=200)
+    assert len(renderer.source.data["x"]) == 120